@@ -2,12 +2,122 @@
 import streamlit as st
 import google.generativeai as genai
 import os
-import io # For handling file streams in memory
+import datetime
+import logging
+import time
 import urllib.parse # For encoding search terms for URLs
+import uuid
 
-# IMPORTS for file parsing
-import PyPDF2
-from docx import Document # For .docx files
+from chat_memory import ChatMemory, history_hash
+from document_engine import DocumentEngine, compact_last_user_turn
+from extraction import ExtractionCache
+from image_pipeline import ImageStore
+from llm_backend import FakeBackend, GeminiBackend, payload_bytes
+from response_cache import ResponseCache
+from response_stream import StreamingResponse
+from telemetry import Telemetry
+from transcript_store import TranscriptStore
+
+logger = logging.getLogger("bolt")
+
+# --- Configuration: Document Retrieval ---
+# Only the top-k most relevant chunks of an uploaded document are sent with each question.
+DOC_CHUNK_CHARS = int(os.environ.get("BOLT_DOC_CHUNK_CHARS", 1500))
+DOC_TOP_K = int(os.environ.get("BOLT_DOC_TOP_K", 4))
+DOC_TOKEN_BUDGET = int(os.environ.get("BOLT_DOC_TOKEN_BUDGET", 2000))
+
+# --- Configuration: Extraction Cache ---
+# Parsed uploads are cached by content hash; set BOLT_EXTRACTION_CACHE_DIR to also keep them on disk.
+EXTRACTION_CACHE_ENTRIES = int(os.environ.get("BOLT_EXTRACTION_CACHE_ENTRIES", 32))
+EXTRACTION_CACHE_DIR = os.environ.get("BOLT_EXTRACTION_CACHE_DIR")
+EXTRACTION_CACHE_DISK_ENTRIES = int(os.environ.get("BOLT_EXTRACTION_CACHE_DISK_ENTRIES", 256)) # Files kept in the disk tier
+# Huge uploads are truncated at these caps instead of stalling the app
+EXTRACTION_MAX_PAGES = int(os.environ.get("BOLT_EXTRACTION_MAX_PAGES", 500))
+EXTRACTION_MAX_CHARS = int(os.environ.get("BOLT_EXTRACTION_MAX_CHARS", 2_000_000))
+
+@st.cache_resource
+def get_extraction_cache():
+    return ExtractionCache(max_entries=EXTRACTION_CACHE_ENTRIES, disk_dir=EXTRACTION_CACHE_DIR, disk_max_entries=EXTRACTION_CACHE_DISK_ENTRIES)
+
+# --- Configuration: Image Uploads ---
+# Uploaded images are downscaled to IMAGE_MAX_SIDE px and re-encoded once, then sent to the model only when first needed.
+IMAGE_MAX_SIDE = int(os.environ.get("BOLT_IMAGE_MAX_SIDE", 1536))
+IMAGE_JPEG_QUALITY = int(os.environ.get("BOLT_IMAGE_JPEG_QUALITY", 85))
+
+@st.cache_resource
+def get_image_store():
+    return ImageStore(max_side=IMAGE_MAX_SIDE, quality=IMAGE_JPEG_QUALITY)
+
+# --- Configuration: Conversation Memory ---
+# The last MEMORY_KEEP_TURNS turns are kept verbatim; older ones are folded into a rolling summary.
+MEMORY_KEEP_TURNS = int(os.environ.get("BOLT_MEMORY_KEEP_TURNS", 6))
+MEMORY_TOKEN_BUDGET = int(os.environ.get("BOLT_MEMORY_TOKEN_BUDGET", 8000))
+
+# --- Configuration: Response Rendering ---
+# While streaming, the reply is redrawn at most every STREAM_RENDER_INTERVAL seconds (or after STREAM_RENDER_CHARS new characters)
+STREAM_RENDER_INTERVAL = float(os.environ.get("BOLT_STREAM_RENDER_INTERVAL", 0.1))
+STREAM_RENDER_CHARS = int(os.environ.get("BOLT_STREAM_RENDER_CHARS", 2000))
+
+# --- Configuration: Response Cache ---
+# Answers are reused for the same question about the same document/image at the same point in the conversation
+# (the chat history so far is part of the key; plain chat without a file is never cached).
+# Set BOLT_RESPONSE_CACHE_DB to keep them in SQLite, and BOLT_RESPONSE_CACHE_NEAR_DUPLICATE=1 to also reuse
+# answers for very similar wording (difflib ratio >= BOLT_RESPONSE_CACHE_SIMILARITY, same numbers).
+RESPONSE_CACHE_ENABLED = os.environ.get("BOLT_RESPONSE_CACHE", "1") == "1"
+RESPONSE_CACHE_ENTRIES = int(os.environ.get("BOLT_RESPONSE_CACHE_ENTRIES", 256))
+RESPONSE_CACHE_TTL_SECONDS = int(os.environ.get("BOLT_RESPONSE_CACHE_TTL_SECONDS", 3600))
+RESPONSE_CACHE_DB = os.environ.get("BOLT_RESPONSE_CACHE_DB")
+RESPONSE_CACHE_NEAR_DUPLICATE = os.environ.get("BOLT_RESPONSE_CACHE_NEAR_DUPLICATE", "0") == "1"
+RESPONSE_CACHE_SIMILARITY = float(os.environ.get("BOLT_RESPONSE_CACHE_SIMILARITY", 0.9))
+
+@st.cache_resource
+def get_response_cache():
+    return ResponseCache(max_entries=RESPONSE_CACHE_ENTRIES, ttl_seconds=RESPONSE_CACHE_TTL_SECONDS, db_path=RESPONSE_CACHE_DB, near_duplicate=RESPONSE_CACHE_NEAR_DUPLICATE, similarity=RESPONSE_CACHE_SIMILARITY)
+
+# --- Configuration: Chat Transcripts ---
+# Messages are stored in SQLite per session (the ?session=... URL parameter), so a session can be reopened after a restart.
+# Only the last TRANSCRIPT_PAGE_SIZE messages are shown at first; older ones load on demand.
+# Messages older than BOLT_TRANSCRIPT_RETENTION_DAYS are deleted (0 keeps them forever).
+TRANSCRIPT_DB = os.environ.get("BOLT_TRANSCRIPT_DB", "bolt_transcripts.db")
+TRANSCRIPT_PAGE_SIZE = int(os.environ.get("BOLT_TRANSCRIPT_PAGE_SIZE", 20))
+TRANSCRIPT_RETENTION_DAYS = float(os.environ.get("BOLT_TRANSCRIPT_RETENTION_DAYS", 30))
+
+@st.cache_resource
+def get_transcript_store():
+    return TranscriptStore(TRANSCRIPT_DB, retention_days=TRANSCRIPT_RETENTION_DAYS)
+
+# --- Configuration: Telemetry ---
+# Per-turn and upload metrics. BOLT_METRICS_JSONL appends every event to a file, BOLT_METRICS_PORT serves
+# Prometheus text at http://127.0.0.1:<port>/metrics, and BOLT_DEBUG_PANEL=1 shows them in the sidebar.
+METRICS_JSONL = os.environ.get("BOLT_METRICS_JSONL")
+METRICS_PORT = int(os.environ.get("BOLT_METRICS_PORT", 0))
+DEBUG_PANEL = os.environ.get("BOLT_DEBUG_PANEL", "0") == "1"
+
+@st.cache_resource
+def get_telemetry():
+    telemetry = Telemetry(jsonl_path=METRICS_JSONL)
+    if METRICS_PORT:
+        try: telemetry.serve(METRICS_PORT)
+        except OSError as e: logger.warning("Could not start metrics endpoint on port %s: %s", METRICS_PORT, e)
+    return telemetry
+
+# --- Configuration: Model & Persona ---
+MODEL_NAME = 'gemini-1.5-flash-latest' # Ensure this model supports multimodal input
+# How the persona reaches the model:
+#   "system" - passed once as a system instruction (default)
+#   "cached" - system instruction stored in a Gemini context cache and referenced by every session
+#   "legacy" - sent as a fake first user turn in every chat history (the old behaviour, kept for comparison)
+PERSONA_MODE = os.environ.get("BOLT_PERSONA_MODE", "system").lower()
+# Context caching needs an explicit model version, so "cached" mode runs on this model rather than MODEL_NAME (the header shows which)
+PERSONA_CACHE_MODEL = os.environ.get("BOLT_PERSONA_CACHE_MODEL", "models/gemini-1.5-flash-002")
+PERSONA_CACHE_TTL = datetime.timedelta(hours=1)
+
+# --- Configuration: Model Backend ---
+# "gemini" talks to Google Gemini; "fake" is a local, deterministic stand-in (no API key needed) used by benchmarks/
+BACKEND = os.environ.get("BOLT_BACKEND", "gemini").lower()
+FAKE_CHUNK_CHARS = int(os.environ.get("BOLT_FAKE_CHUNK_CHARS", 40))
+FAKE_CHUNK_DELAY = float(os.environ.get("BOLT_FAKE_CHUNK_DELAY", 0.0))
+FAKE_RESPONSE_CHARS = int(os.environ.get("BOLT_FAKE_RESPONSE_CHARS", 1200))
 
 # --- Configuration: API Key Handling ---
 api_key_found = None
@@ -16,7 +126,7 @@ try:
 except (FileNotFoundError, KeyError):
     api_key_found = os.environ.get("GEMINI_API_KEY")
 
-if not api_key_found:
+if not api_key_found and BACKEND != "fake":
     st.error("⚠️ Your Gemini API Key is not configured correctly!")
     st.caption("""
         To fix this:
@@ -29,15 +139,6 @@ if not api_key_found:
         Replace `YOUR_KEY_HERE` with your actual API key.
     """)
     st.stop()
-else:
-    try:
-        genai.configure(api_key=api_key_found)
-        MODEL_NAME = 'gemini-1.5-flash-latest' # Ensure this model supports multimodal input
-        model = genai.GenerativeModel(MODEL_NAME)
-    except Exception as e:
-        st.error(f"Error configuring Gemini API: {e}")
-        st.caption("This can happen if the API key is invalid or the model name is incorrect/doesn't support multimodal input.")
-        st.stop()
 
 # --- Define Your Bot's Personality and Initial Instructions ---
 YOUR_BOT_NAME = "Bolt"
@@ -102,17 +203,68 @@ You're the friend everyone wants: knowledgeable, hilarious, and always ready for
 9.  **The Grand Unifier (Your Special Move!):** Whenever possible and natural, find clever and fun ways to link your passions: travel, technology, AND entertainment! For example, "Did you know the visual effects tech used in that Hollywood blockbuster was pioneered by a company in New Zealand, which also happens to be an epic travel destination? We could plan a whole 'Tech & Trek' tour!"
 """
 
+# --- Model: built once per process and shared by every session and rerun ---
+@st.cache_resource(show_spinner=False)
+def get_model(api_key, persona_mode):
+    """Returns (model, the persona mode actually in effect, the persona context cache or None)."""
+    genai.configure(api_key=api_key)
+    if persona_mode == "legacy": return genai.GenerativeModel(MODEL_NAME), "legacy", None
+    if persona_mode == "cached":
+        try:
+            persona_cache = genai.caching.CachedContent.create(model=PERSONA_CACHE_MODEL, display_name=f"{YOUR_BOT_NAME.lower()}-persona", system_instruction=YOUR_BOT_PERSONA_BASE, ttl=PERSONA_CACHE_TTL)
+            return genai.GenerativeModel.from_cached_content(persona_cache), "cached", persona_cache
+        except Exception as e: # e.g. the persona is below the backend's minimum cacheable size
+            logger.warning("Persona context cache unavailable, falling back to a system instruction: %s", e)
+    return genai.GenerativeModel(MODEL_NAME, system_instruction=YOUR_BOT_PERSONA_BASE), "system", None
+
+def keep_persona_cache_alive(persona_cache):
+    """Push the context cache's expiry out while the app is in use, so sessions built on it never outlive it.
+    Returns False once it can't be extended (e.g. it expired while the app sat idle) and the model must be rebuilt."""
+    if persona_cache.expire_time - datetime.datetime.now(datetime.timezone.utc) > PERSONA_CACHE_TTL / 2: return True
+    try:
+        persona_cache.update(ttl=PERSONA_CACHE_TTL)
+        return True
+    except Exception as e:
+        logger.warning("Could not extend the persona context cache, rebuilding it: %s", e)
+        try: persona_cache.delete() # Don't leave it behind if it is somehow still alive
+        except Exception: pass
+        return False
+
+@st.cache_resource(show_spinner=False)
+def get_fake_backend(chunk_chars, chunk_delay, response_chars):
+    return FakeBackend(chunk_chars=chunk_chars, chunk_delay=chunk_delay, response_chars=response_chars)
+
+try:
+    if BACKEND == "fake": backend = get_fake_backend(FAKE_CHUNK_CHARS, FAKE_CHUNK_DELAY, FAKE_RESPONSE_CHARS)
+    else:
+        model, effective_persona_mode, persona_cache = get_model(api_key_found, PERSONA_MODE)
+        if persona_cache is not None and not keep_persona_cache_alive(persona_cache):
+            get_model.clear()
+            model, effective_persona_mode, persona_cache = get_model(api_key_found, PERSONA_MODE)
+        backend = GeminiBackend(model, persona_mode=effective_persona_mode)
+except Exception as e:
+    st.error(f"Error configuring Gemini API: {e}")
+    st.caption("This can happen if the API key is invalid or the model name is incorrect/doesn't support multimodal input.")
+    st.stop()
+
 # --- Streamlit App UI ---
 st.set_page_config(page_title=f"{YOUR_BOT_NAME} - Your Ultimate Fun AI!", page_icon="⚡")
 st.title(f"🎉 Chat with {YOUR_BOT_NAME}! ✈️💻🎬📄🖼️")
-st.caption(f"Your Witty AI Guide for Travel, Tech, Entertainment, Documents & Images! Powered by Google Gemini ({MODEL_NAME})")
+st.caption(f"Your Witty AI Guide for Travel, Tech, Entertainment, Documents & Images! Powered by Google Gemini ({backend.model_name.removeprefix('models/')})")
+if BACKEND != "fake" and backend.persona_mode != PERSONA_MODE: st.caption(f"Persona mode: {backend.persona_mode} (requested: {PERSONA_MODE})")
 
 # --- Session State for Uploaded Content ---
 if "text_file_content" not in st.session_state: st.session_state.text_file_content = None
 if "text_file_name" not in st.session_state: st.session_state.text_file_name = None
+if "text_file_index" not in st.session_state: st.session_state.text_file_index = None
+if "text_file_upload_key" not in st.session_state: st.session_state.text_file_upload_key = None
+if "text_file_extraction" not in st.session_state: st.session_state.text_file_extraction = None
 if "image_file_data" not in st.session_state: st.session_state.image_file_data = None
 if "image_file_name" not in st.session_state: st.session_state.image_file_name = None
 if "image_file_mime_type" not in st.session_state: st.session_state.image_file_mime_type = None
+if "image_file_hash" not in st.session_state: st.session_state.image_file_hash = None
+if "image_file_thumbnail" not in st.session_state: st.session_state.image_file_thumbnail = None
+if "image_file_upload_key" not in st.session_state: st.session_state.image_file_upload_key = None
 
 # --- File Uploader in Sidebar ---
 with st.sidebar:
@@ -125,141 +277,204 @@ with st.sidebar:
     st.caption("Bolt can analyze .png, .jpg, .jpeg, .webp, .gif images!")
     uploaded_image_file = st.file_uploader("Upload an image...", type=['png', 'jpg', 'jpeg', 'webp', 'gif'], key="image_uploader")
 
-    if uploaded_text_file is not None:
+    # Streamlit reruns this script on every interaction; only handle an upload the first time we see it
+    text_upload_key = (getattr(uploaded_text_file, "file_id", None) or f"{uploaded_text_file.name}:{uploaded_text_file.size}") if uploaded_text_file is not None else None
+    if uploaded_text_file is None: st.session_state.text_file_upload_key = None
+    elif st.session_state.text_file_upload_key != text_upload_key:
+        st.session_state.text_file_upload_key = text_upload_key
         st.session_state.image_file_data = None
         st.session_state.image_file_name = None
         st.session_state.image_file_mime_type = None
+        st.session_state.image_file_hash = None
+        st.session_state.image_file_thumbnail = None
         file_bytes = uploaded_text_file.getvalue()
         file_name = uploaded_text_file.name
         file_extension = os.path.splitext(file_name)[1].lower()
         extracted_text = None
         try:
-            if file_extension == ".pdf":
-                pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_bytes))
-                text = ""
-                for page_num in range(len(pdf_reader.pages)): text += pdf_reader.pages[page_num].extract_text() or ""
-                extracted_text = text
-            elif file_extension == ".docx":
-                doc = Document(io.BytesIO(file_bytes))
-                extracted_text = "\n".join([para.text for para in doc.paragraphs])
-            elif file_extension == ".doc":
+            if file_extension == ".doc":
                 st.warning(f"Sorry, Bolt finds old .doc files a bit tricky! Please convert '{file_name}' to .docx or .pdf.")
             else:
-                extracted_text = file_bytes.decode("utf-8", errors="replace")
+                progress_bar = st.progress(0.0, text=f"Bolt is reading '{file_name}'...")
+                preview_placeholder = st.empty()
+                progress_unit = "paragraph" if file_extension == ".docx" else "page"
+                def show_extraction_progress(done, total, page_text):
+                    progress_bar.progress(done / total, text=f"Bolt is reading '{file_name}'... {progress_unit} {done}/{total}")
+                    if done == 1 and page_text.strip(): preview_placeholder.caption(f"Preview: {page_text.strip()[:200]}...")
+                extraction_started = time.perf_counter()
+                extracted_text, extraction_info = get_extraction_cache().extract(file_bytes, file_extension, max_pages=EXTRACTION_MAX_PAGES, max_chars=EXTRACTION_MAX_CHARS, on_progress=show_extraction_progress)
+                from_cache = extraction_info["source"] != "extracted"
+                get_telemetry().record("extraction", {"format": file_extension or "text", "source": extraction_info["source"]}, {
+                    "lookup_seconds": time.perf_counter() - extraction_started, "extract_seconds": 0.0 if from_cache else extraction_info["seconds"],
+                    "saved_seconds": extraction_info["seconds"] if from_cache else 0.0, "file_bytes": len(file_bytes), "chars": len(extracted_text or "")})
+                progress_bar.empty(); preview_placeholder.empty()
+                st.session_state.text_file_extraction = extraction_info
+                if extraction_info["truncated"]: st.warning(f"'{file_name}' is very large, so Bolt only read the first part of it (up to {EXTRACTION_MAX_PAGES} pages / {EXTRACTION_MAX_CHARS:,} characters).")
             if extracted_text:
                 st.session_state.text_file_content = extracted_text
                 st.session_state.text_file_name = file_name
+                st.session_state.text_file_index = DocumentEngine(file_name, extracted_text, chunk_chars=DOC_CHUNK_CHARS, top_k=DOC_TOP_K, token_budget=DOC_TOKEN_BUDGET)
                 st.success(f"✔️ Text document '{file_name}' uploaded! Ask Bolt about it.")
             elif file_extension != ".doc": st.error(f"Could not extract text from '{file_name}'.")
         except Exception as e:
             st.error(f"Error processing text file '{file_name}': {e}")
-            st.session_state.text_file_content = None; st.session_state.text_file_name = None
+            st.session_state.text_file_content = None; st.session_state.text_file_name = None; st.session_state.text_file_index = None
 
-    if uploaded_image_file is not None:
+    image_upload_key = (getattr(uploaded_image_file, "file_id", None) or f"{uploaded_image_file.name}:{uploaded_image_file.size}") if uploaded_image_file is not None else None
+    if uploaded_image_file is None: st.session_state.image_file_upload_key = None
+    elif st.session_state.image_file_upload_key != image_upload_key:
+        st.session_state.image_file_upload_key = image_upload_key
         st.session_state.text_file_content = None
         st.session_state.text_file_name = None
-        image_bytes = uploaded_image_file.getvalue()
-        st.session_state.image_file_data = image_bytes
-        st.session_state.image_file_name = uploaded_image_file.name
-        st.session_state.image_file_mime_type = uploaded_image_file.type
-        st.success(f"✔️ Image '{uploaded_image_file.name}' uploaded! Ask Bolt about it.")
+        st.session_state.text_file_index = None
+        try:
+            image_started = time.perf_counter()
+            processed_image = get_image_store().get(uploaded_image_file.getvalue(), uploaded_image_file.type)
+            get_telemetry().record("image_upload", {"mime_type": processed_image.mime_type}, {
+                "process_seconds": time.perf_counter() - image_started, "original_bytes": processed_image.original_size, "processed_bytes": len(processed_image.data)})
+            st.session_state.image_file_data = processed_image.data
+            st.session_state.image_file_name = uploaded_image_file.name
+            st.session_state.image_file_mime_type = processed_image.mime_type
+            st.session_state.image_file_hash = processed_image.sha256
+            st.session_state.image_file_thumbnail = processed_image.thumbnail
+            st.success(f"✔️ Image '{uploaded_image_file.name}' uploaded! Ask Bolt about it.")
+            if len(processed_image.data) < processed_image.original_size: st.caption(f"Optimized for Bolt: {processed_image.original_size / 1024:.0f} KB → {len(processed_image.data) / 1024:.0f} KB ({processed_image.width}×{processed_image.height})")
+        except Exception as e:
+            st.error(f"Error processing image '{uploaded_image_file.name}': {e}")
+            st.session_state.image_file_data = None; st.session_state.image_file_name = None; st.session_state.image_file_mime_type = None; st.session_state.image_file_hash = None; st.session_state.image_file_thumbnail = None
 
     active_context = False
     if st.session_state.text_file_name:
         st.info(f"Text in context: **{st.session_state.text_file_name}**")
+        if st.session_state.text_file_extraction:
+            extraction_info = st.session_state.text_file_extraction
+            if extraction_info["source"] == "extracted": st.caption(f"Extracted in {extraction_info['seconds'] * 1000:.0f} ms")
+            else: st.caption(f"Loaded from {extraction_info['source']} cache (saved ~{extraction_info['seconds'] * 1000:.0f} ms)")
         if st.button("Clear Text Context", key="clear_text"):
-            st.session_state.text_file_content = None; st.session_state.text_file_name = None; st.rerun()
+            st.session_state.text_file_content = None; st.session_state.text_file_name = None; st.session_state.text_file_index = None; st.rerun()
         active_context = True
     if st.session_state.image_file_name:
         st.info(f"Image in context: **{st.session_state.image_file_name}**")
-        st.image(st.session_state.image_file_data, use_container_width=True)
+        st.image(st.session_state.image_file_thumbnail, use_container_width=True)
         if st.button("Clear Image Context", key="clear_image"):
-            st.session_state.image_file_data = None; st.session_state.image_file_name = None; st.session_state.image_file_mime_type = None; st.rerun()
+            st.session_state.image_file_data = None; st.session_state.image_file_name = None; st.session_state.image_file_mime_type = None; st.session_state.image_file_hash = None; st.session_state.image_file_thumbnail = None; st.rerun()
         active_context = True
     if not active_context: st.caption("No file or image currently in context.")
 
+    extraction_stats = get_extraction_cache().stats()
+    if extraction_stats:
+        with st.expander("⏱️ Extraction timings"):
+            for fmt, stat in extraction_stats.items():
+                avg_ms = (stat["extract_seconds"] / stat["extractions"] * 1000) if stat["extractions"] else 0
+                st.caption(f"**{fmt or 'text'}**: {stat['extractions']} extracted (avg {avg_ms:.0f} ms), {stat['memory_hits']} memory / {stat['disk_hits']} disk hits, ~{stat['seconds_saved'] * 1000:.0f} ms saved")
+
+    memory_caption_placeholder = st.empty() # Filled in after the chat logic, so it reflects this run's turn
+
+    if DEBUG_PANEL: debug_panel = st.container() # Filled in after the chat logic, like the memory caption
+
 # --- Chat Logic ---
-if "messages" not in st.session_state: st.session_state.messages = []
+if "session_id" not in st.session_state:
+    # Reuse the session from the URL if there is one, so reloading (or a server restart) picks the chat back up
+    st.session_state.session_id = st.query_params.get("session") or uuid.uuid4().hex
+    st.query_params["session"] = st.session_state.session_id
+if "transcript_window" not in st.session_state: st.session_state.transcript_window = TRANSCRIPT_PAGE_SIZE
+transcript_store = get_transcript_store()
+session_id = st.session_state.session_id
+
+if "gemini_chat" in st.session_state and not backend.owns(st.session_state.gemini_chat):
+    # The shared model was rebuilt (e.g. its persona cache expired): carry this session's history over to the new one
+    st.session_state.gemini_chat = backend.start_chat(list(st.session_state.gemini_chat.history))
+    st.session_state.chat_memory.chat = st.session_state.gemini_chat
 if "gemini_chat" not in st.session_state:
     try:
-        initial_history = [
-            {"role": "user", "parts": [YOUR_BOT_PERSONA_BASE]},
-            {"role": "model", "parts": [f"Woohoo! Passport, processors, popcorn, file scanner, AND image analyzer all online! I'm {YOUR_BOT_NAME}, ready for any quest: worldly, wired, wonderfully cinematic, text-based, or visual! What's our adventure today? 🗺️💻🎬📄🖼️🤩"]}
-        ]
-        st.session_state.gemini_chat = model.start_chat(history=initial_history)
+        initial_history = [] # The persona travels as a system instruction
+        if PERSONA_MODE == "legacy":
+            initial_history = [
+                {"role": "user", "parts": [YOUR_BOT_PERSONA_BASE]},
+                {"role": "model", "parts": [f"Woohoo! Passport, processors, popcorn, file scanner, AND image analyzer all online! I'm {YOUR_BOT_NAME}, ready for any quest: worldly, wired, wonderfully cinematic, text-based, or visual! What's our adventure today? 🗺️💻🎬📄🖼️🤩"]}
+            ]
+        restored_history = transcript_store.chat_history(session_id, MEMORY_KEEP_TURNS) # Empty for a brand-new session
+        st.session_state.gemini_chat = backend.start_chat(initial_history + restored_history)
+        def summarize_turns(previous_summary, turns_text):
+            summary_prompt = f"Summarize this conversation between a user and {YOUR_BOT_NAME} in under 200 words. Keep names, facts, preferences, plans and open questions; drop the jokes.\n\n"
+            if previous_summary: summary_prompt += f"Summary of even earlier turns:\n{previous_summary}\n\n"
+            return backend.generate_text(summary_prompt + f"Conversation:\n{turns_text}")
+        st.session_state.chat_memory = ChatMemory(st.session_state.gemini_chat, pinned=len(initial_history), keep_turns=MEMORY_KEEP_TURNS, token_budget=MEMORY_TOKEN_BUDGET, summarizer=summarize_turns)
     except Exception as e: st.error(f"Failed to start Gemini chat session with {YOUR_BOT_NAME}: {e}"); st.stop()
 
-for message in st.session_state.messages:
+# Only the most recent window of the transcript is loaded and rendered on each rerun
+visible_messages = transcript_store.recent(session_id, st.session_state.transcript_window + 1)
+if len(visible_messages) > st.session_state.transcript_window:
+    visible_messages = visible_messages[1:]
+    if st.button("⬆️ Load older messages", key="load_older"):
+        st.session_state.transcript_window += TRANSCRIPT_PAGE_SIZE; st.rerun()
+for message in visible_messages:
     avatar_icon = "🧑‍💻" if message["role"] == "user" else "⚡"
     with st.chat_message(message["role"], avatar=avatar_icon):
         st.markdown(message["content"])
 
 if prompt := st.chat_input(f"Ask {YOUR_BOT_NAME} about travel, tech, entertainment, your document, or image!"):
-    st.session_state.messages.append({"role": "user", "content": prompt})
+    turn_started = time.perf_counter()
+    transcript_store.append(session_id, "user", prompt)
     with st.chat_message("user", avatar="🧑‍💻"): st.markdown(prompt)
 
     gemini_prompt_parts = []
+    document_reference = None # Stored in chat history in place of the document excerpts
+    context_hash = None # Identifies the document/image the answer depends on, for the response cache
     user_text_prompt_for_api = f"User asks: {prompt}\n"
     if st.session_state.image_file_data and st.session_state.image_file_mime_type:
-        user_text_prompt_for_api = (f"The user has uploaded an image named '{st.session_state.image_file_name}'. Please analyze this image in conjunction with their question. User's question: '{prompt}'")
-        gemini_prompt_parts.append({"mime_type": st.session_state.image_file_mime_type, "data": st.session_state.image_file_data})
+        context_hash = st.session_state.image_file_hash
+        if st.session_state.image_file_hash in st.session_state.chat_memory.attached_hashes():
+            # Still in the chat history from an earlier turn, so refer to it instead of sending it again
+            user_text_prompt_for_api = (f"The user is still asking about the image named '{st.session_state.image_file_name}' they shared earlier in our conversation. Please analyze that image in conjunction with their question. User's question: '{prompt}'")
+        else:
+            user_text_prompt_for_api = (f"The user has uploaded an image named '{st.session_state.image_file_name}'. Please analyze this image in conjunction with their question. User's question: '{prompt}'")
+            gemini_prompt_parts.append({"mime_type": st.session_state.image_file_mime_type, "data": st.session_state.image_file_data})
         gemini_prompt_parts.append(user_text_prompt_for_api)
-    elif st.session_state.text_file_content:
-        user_text_prompt_for_api = (f"The user has uploaded a text document named '{st.session_state.text_file_name}'. Please consider the following extracted text as primary context. User's question: '{prompt}'\n\n--- START OF EXTRACTED FILE CONTENT ({st.session_state.text_file_name}) ---\n{st.session_state.text_file_content}\n--- END OF EXTRACTED FILE CONTENT ---\n\nNow, answer the user's question based on all available information, prioritizing the file content if relevant.")
+    elif st.session_state.text_file_index:
+        doc_engine = st.session_state.text_file_index
+        context_hash = doc_engine.doc_id
+        document_context, used_chunk_ids = doc_engine.context(prompt)
+        content_label = st.session_state.text_file_name if used_chunk_ids is None else f"{st.session_state.text_file_name}, most relevant excerpts"
+        user_text_prompt_for_api = (f"The user has uploaded a text document named '{st.session_state.text_file_name}'. Please consider the following extracted text as primary context. User's question: '{prompt}'\n\n--- START OF EXTRACTED FILE CONTENT ({content_label}) ---\n{document_context}\n--- END OF EXTRACTED FILE CONTENT ---\n\nNow, answer the user's question based on all available information, prioritizing the file content if relevant.")
         gemini_prompt_parts.append(user_text_prompt_for_api)
+        document_reference = f"The user asked about their text document. {doc_engine.reference(used_chunk_ids)} User's question: '{prompt}'"
     else:
         gemini_prompt_parts.append(user_text_prompt_for_api)
 
     try:
         with st.spinner(f"{YOUR_BOT_NAME} is analyzing (text, images, and all that jazz!)... 🌐🖼️📄✨"):
-            if model is None: st.error("Model not initialized. Check API key and configuration."); st.stop()
-            response = st.session_state.gemini_chat.send_message(gemini_prompt_parts, stream=True)
+            if backend is None: st.error("Model not initialized. Check API key and configuration."); st.stop()
+            st.session_state.chat_memory.before_turn()
+            # Scoped to the document/image and the conversation so far, so an answer never carries over another chat's details
+            cache_scope = f"{context_hash}:{history_hash(st.session_state.gemini_chat.history)}" if RESPONSE_CACHE_ENABLED and context_hash else None
+            prompt_built_at = time.perf_counter()
+            cached_response = get_response_cache().get(prompt, cache_scope, backend.model_name) if cache_scope else None
+            send_started = time.perf_counter()
+            if cached_response is None: response = st.session_state.gemini_chat.send_message(gemini_prompt_parts, stream=True)
 
             with st.chat_message("assistant", avatar="⚡"):
-                full_response_content = ""
-                response_placeholder = st.empty()
-                for chunk in response:
-                    if chunk.parts: full_response_content += chunk.text
-                    response_placeholder.markdown(full_response_content + "▌")
-                
-                # Process the full_response_content for image suggestions
-                final_text_lines = []
-                direct_image_urls_to_display = []
-                search_terms_to_suggest = []
-                lines = full_response_content.split('\n')
-
-                for line in lines:
-                    stripped_line = line.strip()
-                    # Check for DIRECT_IMAGE_URL
-                    if stripped_line.startswith("DIRECT_IMAGE_URL:"):
-                        try:
-                            url = stripped_line.split(":", 1)[1].strip()
-                            if url and (url.startswith("http://") or url.startswith("https://")):
-                                direct_image_urls_to_display.append(url)
-                                continue # Line processed, don't add to final_text_lines
-                            else: # Invalid URL format after prefix
-                                final_text_lines.append(line) # Keep original line
-                        except IndexError: # Malformed line
-                            final_text_lines.append(line) # Keep original line
-                    
-                    # Check for IMAGE_SEARCH_TERM_1 or IMAGE_SEARCH_TERM_2
-                    elif stripped_line.startswith("IMAGE_SEARCH_TERM_1:") or \
-                         stripped_line.startswith("IMAGE_SEARCH_TERM_2:"):
-                        try:
-                            term_prefix = "IMAGE_SEARCH_TERM_1:" if stripped_line.startswith("IMAGE_SEARCH_TERM_1:") else "IMAGE_SEARCH_TERM_2:"
-                            term = stripped_line.split(term_prefix, 1)[1].strip()
-                            if term:
-                                search_terms_to_suggest.append(term)
-                                continue # Line processed, don't add to final_text_lines
-                            else: # Empty term
-                                final_text_lines.append(line) # Keep original line
-                        except IndexError: # Malformed line
-                            final_text_lines.append(line) # Keep original line
-                    else: # Not a special line
-                        final_text_lines.append(line)
-                
-                final_text_to_display = "\n".join(final_text_lines).strip()
-                response_placeholder.markdown(final_text_to_display)
+                # Directive lines (image URLs / search terms) are pulled out as they stream in, and redraws are throttled
+                response_stream = StreamingResponse(st.empty(), min_interval=STREAM_RENDER_INTERVAL, min_chars=STREAM_RENDER_CHARS)
+                if cached_response is not None:
+                    # Replayed through the same renderer/parser, and recorded so the conversation still follows on
+                    response_stream.feed(cached_response)
+                    response_stream.finish()
+                    st.caption("⚡ Instant replay: Bolt has answered this one before!")
+                    st.session_state.chat_memory.record_turn(document_reference or user_text_prompt_for_api, cached_response)
+                else:
+                    chunk_count = 0
+                    for chunk in response:
+                        chunk_count += 1
+                        if chunk.parts: response_stream.feed(chunk.text)
+                    stream_done = time.perf_counter()
+                    response_stream.finish()
+                    if document_reference: compact_last_user_turn(st.session_state.gemini_chat, document_reference)
+                    if cache_scope and response_stream.full_text.strip(): get_response_cache().put(prompt, cache_scope, backend.model_name, response_stream.full_text)
+                st.session_state.chat_memory.after_turn()
+                full_response_content = response_stream.full_text
+                direct_image_urls_to_display = response_stream.image_urls
+                search_terms_to_suggest = response_stream.search_terms
 
                 # Display direct images if any were found
                 if direct_image_urls_to_display:
@@ -285,9 +500,42 @@ if prompt := st.chat_input(f"Ask {YOUR_BOT_NAME} about travel, tech, entertainme
                         google_images_url = f"https://www.google.com/search?tbm=isch&q={encoded_term}"
                         st.markdown(f"- [{term}]({google_images_url})")
                 
-                st.session_state.messages.append({"role": "assistant", "content": full_response_content}) # Store original full response
-                
+                transcript_store.append(session_id, "assistant", full_response_content) # Store original full response
+
+            # --- Turn metrics ---
+            turn_values = {"prompt_build_seconds": prompt_built_at - turn_started, "cache_lookup_seconds": send_started - prompt_built_at,
+                           "render_seconds": response_stream.render_seconds, "parse_seconds": response_stream.parse_seconds, "redraws": response_stream.redraws,
+                           "output_chars": len(full_response_content), "total_seconds": time.perf_counter() - turn_started}
+            if cached_response is None:
+                usage = getattr(response, "usage_metadata", None)
+                stream_seconds = stream_done - response_stream.first_chunk_at if response_stream.first_chunk_at else 0
+                turn_values.update({"input_tokens": getattr(usage, "prompt_token_count", None), "output_tokens": getattr(usage, "candidates_token_count", None),
+                                    "payload_bytes": payload_bytes(gemini_prompt_parts),
+                                    "ttfc_seconds": response_stream.first_chunk_at - send_started if response_stream.first_chunk_at else None,
+                                    "chunks": chunk_count, "chunks_per_second": chunk_count / stream_seconds if stream_seconds else None})
+            st.session_state.last_turn_metrics = get_telemetry().record("turn", {"backend": backend.name, "persona": backend.persona_mode, "cache_hit": int(cached_response is not None)}, turn_values)
+
     except Exception as e:
         error_message = f"Whoops! {YOUR_BOT_NAME}'s visual sensors (or something else) hit a snag: {e}"
         st.error(error_message)
-        st.session_state.messages.append({"role": "assistant", "content": f"Sorry, I ran into an issue: {error_message}"})
\ No newline at end of file
+        transcript_store.append(session_id, "assistant", f"Sorry, I ran into an issue: {error_message}", kind="error")
+        try: st.session_state.gemini_chat.history
+        except Exception:
+            # A blocked or broken stream leaves a Gemini session's history unreadable until that exchange is dropped
+            try: st.session_state.gemini_chat.rewind(); st.session_state.gemini_chat.history
+            except Exception: # Still unusable: rebuild it from the stored transcript on the next run
+                del st.session_state.gemini_chat; del st.session_state.chat_memory
+        get_telemetry().record("turn_error", {"backend": backend.name, "persona": backend.persona_mode, "error": type(e).__name__}, {"total_seconds": time.perf_counter() - turn_started})
+
+# --- Sidebar panels that depend on this run's turn ---
+try: memory_stats = st.session_state.chat_memory.stats() if "chat_memory" in st.session_state else None
+except Exception: memory_stats = None # Never let the sidebar break the page
+if memory_stats:
+    memory_caption_placeholder.caption(f"🧠 Chat memory: {memory_stats['turns']} recent turns{' + summary' if memory_stats['summarized'] else ''}, ~{memory_stats['tokens']:,} tokens / {memory_stats['bytes'] / 1024:.1f} KB")
+if DEBUG_PANEL:
+    with debug_panel, st.expander("🛠️ Debug metrics"):
+        if st.session_state.get("last_turn_metrics"):
+            st.caption("Last turn in this session")
+            st.json(st.session_state.last_turn_metrics)
+        st.caption("Recent events (all sessions)")
+        st.json(list(get_telemetry().recent)[-10:], expanded=False)
@@ -0,0 +1,112 @@
+# benchmarks/bench_app.py
+# Drives app.py headlessly (Streamlit AppTest) against the local fake backend, so the numbers are our own
+# overhead - extraction, prompt building, rendering, parsing - and not Gemini's network time.
+# Documents and images go through the sidebar uploaders, so upload_ms covers extraction/indexing or the image
+# pipeline with the app's own BOLT_* settings.
+#
+#   python benchmarks/bench_app.py                      # default matrix
+#   python benchmarks/bench_app.py --doc-kb 0 500 --doc-format docx --turns 10 --image-px 0 4000 --output bench_output.txt
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Must be set before app.py runs; every knob is read from the environment on each script run
+os.environ["BOLT_BACKEND"] = "fake"
+os.environ.setdefault("BOLT_RESPONSE_CACHE", "0") # Otherwise repeated prompts would measure the cache, not the pipeline
+os.environ.setdefault("BOLT_TRANSCRIPT_DB", os.path.join(tempfile.mkdtemp(prefix="bolt-bench-"), "transcripts.db"))
+
+from streamlit.testing.v1 import AppTest
+
+QUESTIONS = ["What are the main points?", "Plan a 3-day itinerary for Kyoto", "Which laptop is best for travel?", "Summarize the last section", "Any K-drama recommendations?"]
+
+
+DOC_MIME_TYPES = {"txt": "text/plain", "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document"}
+
+
+def make_document(kb, doc_format):
+    sentence = "Bolt's benchmark document talks about Kyoto temples, laptop batteries and K-drama plot twists. "
+    text = (sentence * (kb * 1024 // len(sentence) + 1))[:kb * 1024]
+    if doc_format == "txt": return text.encode("utf-8")
+    from docx import Document
+    document, buffer = Document(), io.BytesIO()
+    for start in range(0, len(text), 1000): document.add_paragraph(text[start:start + 1000])
+    document.save(buffer)
+    return buffer.getvalue()
+
+def make_image(px):
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.effect_noise((px, px * 3 // 4), 40).convert("RGB").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def run_scenario(doc_kb, doc_format, image_px, turns):
+    at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=120)
+    started = time.perf_counter()
+    at.run()
+    first_render_ms = (time.perf_counter() - started) * 1000
+    if at.exception: raise RuntimeError(at.exception[0].value)
+
+    # The upload rerun does the real work: extraction + indexing, or decode/resize/re-encode
+    upload = None
+    if doc_kb: upload = ("text_uploader", (f"bench-{doc_kb}kb.{doc_format}", make_document(doc_kb, doc_format), DOC_MIME_TYPES[doc_format]))
+    elif image_px: upload = ("image_uploader", (f"bench-{image_px}px.png", make_image(image_px), "image/png"))
+    upload_ms = 0.0
+    if upload:
+        uploader = at.file_uploader(key=upload[0]).set_value(upload[1])
+        started = time.perf_counter()
+        uploader.run()
+        upload_ms = (time.perf_counter() - started) * 1000
+        if at.exception: raise RuntimeError(at.exception[0].value)
+
+    results = []
+    for turn in range(turns):
+        tracemalloc.start()
+        wall_started, cpu_started = time.perf_counter(), time.process_time()
+        at.chat_input[0].set_value(QUESTIONS[turn % len(QUESTIONS)]).run()
+        wall_ms = (time.perf_counter() - wall_started) * 1000
+        cpu_ms = (time.process_time() - cpu_started) * 1000
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        if at.exception: raise RuntimeError(at.exception[0].value)
+        requests = at.session_state["gemini_chat"].requests
+        results.append({"turn": turn + 1, "wall_ms": wall_ms, "cpu_ms": cpu_ms, "peak_kb": peak / 1024, "bytes_sent": requests[-1] if requests else 0})
+    return first_render_ms, upload_ms, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless latency benchmark for the Bolt app (fake backend).")
+    parser.add_argument("--doc-kb", type=int, nargs="+", default=[0, 100, 1000], help="Document sizes in KB (0 = no document)")
+    parser.add_argument("--doc-format", choices=sorted(DOC_MIME_TYPES), default="txt", help="Format the document is uploaded as")
+    parser.add_argument("--image-px", type=int, nargs="+", default=[0, 2000], help="Image widths in px (0 = no image)")
+    parser.add_argument("--turns", type=int, default=8)
+    parser.add_argument("--chunk-chars", type=int, default=40)
+    parser.add_argument("--chunk-delay", type=float, default=0.0, help="Seconds the fake backend waits before each chunk")
+    parser.add_argument("--response-chars", type=int, default=1200)
+    parser.add_argument("--output", help="Also write the report to this file")
+    args = parser.parse_args()
+    os.environ["BOLT_FAKE_CHUNK_CHARS"] = str(args.chunk_chars)
+    os.environ["BOLT_FAKE_CHUNK_DELAY"] = str(args.chunk_delay)
+    os.environ["BOLT_FAKE_RESPONSE_CHARS"] = str(args.response_chars)
+
+    lines = [f"{'doc_kb':>6} {'image_px':>8} {'first_render_ms':>15} {'upload_ms':>9} {'turn':>4} {'wall_ms':>9} {'cpu_ms':>9} {'peak_kb':>9} {'bytes_sent':>10}"]
+    for doc_kb in args.doc_kb:
+        for image_px in args.image_px:
+            if doc_kb and image_px: continue # The app keeps one kind of context at a time
+            first_render_ms, upload_ms, results = run_scenario(doc_kb, args.doc_format, image_px, args.turns)
+            for r in results:
+                lines.append(f"{doc_kb:>6} {image_px:>8} {first_render_ms:>15.1f} {upload_ms:>9.1f} {r['turn']:>4} {r['wall_ms']:>9.1f} {r['cpu_ms']:>9.1f} {r['peak_kb']:>9.0f} {r['bytes_sent']:>10}")
+            print("\n".join(lines[-len(results):]), flush=True)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f: f.write("\n".join(lines) + "\n")
+
+
+if __name__ == "__main__":
+    main()
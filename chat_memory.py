@@ -0,0 +1,148 @@
+# chat_memory.py
+# Keeps the Gemini chat history bounded: recent turns verbatim, older ones folded into a rolling summary.
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+from document_engine import estimate_tokens
+
+IMAGE_TOKENS = 258 # Roughly what Gemini charges for one inline image
+SUMMARY_PREFIX = "Summary of our conversation so far (older turns were condensed to save space):"
+SUMMARY_ACK = "Got it! I'll keep that earlier chat in mind. 🧠"
+
+# Summaries are built off the hot path, on a small pool shared by every session
+_summary_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="bolt-summary")
+
+
+# --- Helpers that work on both protos (from the API) and plain dicts/strings (what we send) ---
+def _part_text(part):
+    if isinstance(part, str): return part
+    if isinstance(part, dict): return part.get("text", "")
+    return getattr(part, "text", "") or ""
+
+def _part_blob(part):
+    """Return (mime_type, data) for an inline attachment, else None."""
+    if isinstance(part, str): return None
+    if isinstance(part, dict): return (part["mime_type"], part["data"]) if "data" in part else None
+    blob = getattr(part, "inline_data", None)
+    return (blob.mime_type, blob.data) if blob is not None and blob.data else None
+
+def _role(content):
+    return content["role"] if isinstance(content, dict) else content.role
+
+def _parts(content):
+    return content["parts"] if isinstance(content, dict) else content.parts
+
+def content_size(content):
+    """(estimated tokens, bytes) for one history entry."""
+    tokens = size = 0
+    for part in _parts(content):
+        blob = _part_blob(part)
+        if blob: tokens += IMAGE_TOKENS; size += len(blob[1])
+        else:
+            text = _part_text(part)
+            tokens += estimate_tokens(text); size += len(text.encode("utf-8"))
+    return tokens, size
+
+def strip_attachments(content):
+    """Copy of a history entry with inline attachments replaced by a short text marker."""
+    parts = []
+    for part in _parts(content):
+        blob = _part_blob(part)
+        if blob: parts.append(f"[Attachment ({blob[0]}, sha256 {hashlib.sha256(blob[1]).hexdigest()[:12]}) was shared here and has been removed from memory]")
+        else: parts.append(_part_text(part))
+    return {"role": _role(content), "parts": parts}
+
+def transcript(contents):
+    return "\n".join(f"{_role(c).upper()}: " + " ".join(_part_text(p) for p in _parts(c) if not _part_blob(p)) for c in contents)
+
+def history_hash(contents):
+    """sha256 over a history's roles, text and attachments; equal only for the same conversation so far."""
+    digest = hashlib.sha256()
+    for content in contents:
+        digest.update(_role(content).encode("utf-8") + b"\0")
+        for part in _parts(content):
+            blob = _part_blob(part)
+            digest.update(hashlib.sha256(blob[1]).digest() if blob else _part_text(part).encode("utf-8"))
+            digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def fallback_summary(previous_summary, turns_text, limit=1500):
+    # Used when no summarizer is configured or it fails: keep the tail end, trimmed
+    combined = f"{previous_summary}\n{turns_text}".strip() if previous_summary else turns_text
+    return combined if len(combined) <= limit else "..." + combined[-limit:]
+
+
+class ChatMemory:
+    """Wraps a chat session and keeps its history within a token budget.
+
+    History layout: [pinned entries] + [summary user/model pair, once there is one] + [recent turns].
+    Call before_turn() right before send_message and after_turn() once the response has been consumed.
+    """
+
+    def __init__(self, chat_session, pinned=0, keep_turns=6, token_budget=6000, summarizer=None):
+        self.chat = chat_session
+        self.pinned = pinned # Leading entries (e.g. the persona) that are never summarized
+        self.keep_turns = keep_turns
+        self.token_budget = token_budget
+        self.summarizer = summarizer # summarizer(previous_summary, transcript_text) -> str
+        self.summary = None
+        self._pending = None # (future, number of turns it covers)
+
+    def _split(self, history):
+        body_start = self.pinned + (2 if self.summary else 0)
+        return history[:body_start], history[body_start:]
+
+    def _summarize(self, previous_summary, turns_text):
+        if self.summarizer:
+            try:
+                summary = self.summarizer(previous_summary, turns_text)
+                if summary and summary.strip(): return summary.strip()
+            except Exception: pass # Fall through to the cheap summary rather than lose the turns
+        return fallback_summary(previous_summary, turns_text)
+
+    def before_turn(self):
+        """Fold in a finished background summary, dropping the turns it replaces."""
+        if not self._pending or not self._pending[0].done(): return
+        future, covered = self._pending
+        self._pending = None
+        history = list(self.chat.history)
+        head, body = self._split(history)
+        self.summary = future.result()
+        summary_pair = [{"role": "user", "parts": [f"{SUMMARY_PREFIX}\n{self.summary}"]}, {"role": "model", "parts": [SUMMARY_ACK]}]
+        self.chat.history = head[:self.pinned] + summary_pair + body[covered * 2:]
+
+    def after_turn(self):
+        """Strip attachments from turns outside the verbatim window and schedule a summary if over budget."""
+        history = list(self.chat.history)
+        head, body = self._split(history)
+        keep_from = max(0, len(body) - self.keep_turns * 2)
+        if any(_part_blob(p) for c in body[:keep_from] for p in _parts(c)):
+            body = [strip_attachments(c) for c in body[:keep_from]] + body[keep_from:]
+            self.chat.history = head + body
+        if self._pending: return # One summary at a time; the next turn will catch up
+
+        turn_tokens = [sum(content_size(c)[0] for c in body[i:i + 2]) for i in range(0, len(body), 2)]
+        n_turns = len(turn_tokens)
+        overflow = max(0, n_turns - self.keep_turns)
+        tokens = sum(content_size(c)[0] for c in head) + sum(turn_tokens[overflow:])
+        while tokens > self.token_budget and overflow < n_turns - 1: # Always keep the latest turn verbatim
+            tokens -= turn_tokens[overflow]; overflow += 1
+        if overflow:
+            turns_text = transcript(body[:overflow * 2])
+            self._pending = (_summary_pool.submit(self._summarize, self.summary, turns_text), overflow)
+
+    def record_turn(self, user_text, model_text):
+        """Append a turn that didn't go through send_message (e.g. a cached answer) to the history."""
+        self.chat.history = list(self.chat.history) + [{"role": "user", "parts": [user_text]}, {"role": "model", "parts": [model_text]}]
+
+    def attached_hashes(self):
+        """sha256 hex digests of the inline attachments still present in the history."""
+        return {hashlib.sha256(blob[1]).hexdigest() for c in self.chat.history for p in _parts(c) if (blob := _part_blob(p))}
+
+    def stats(self):
+        history = list(self.chat.history)
+        tokens = sum(content_size(c)[0] for c in history)
+        size = sum(content_size(c)[1] for c in history)
+        return {"turns": len(self._split(history)[1]) // 2, "tokens": tokens, "bytes": size,
+                "summarized": self.summary is not None, "summary_pending": self._pending is not None}
@@ -0,0 +1,137 @@
+# document_engine.py
+# Chunks uploaded documents and retrieves only the passages relevant to a question,
+# so Bolt doesn't have to re-read (and re-bill) the whole file on every turn.
+import hashlib
+import heapq
+import math
+import re
+from collections import Counter
+
+# --- Defaults (overridable from app.py) ---
+DEFAULT_CHUNK_CHARS = 1500     # Target size of one chunk, in characters
+DEFAULT_CHUNK_OVERLAP = 200    # Characters carried over between neighbouring chunks
+DEFAULT_TOP_K = 4              # Max chunks sent with a question
+DEFAULT_TOKEN_BUDGET = 2000    # Max (estimated) tokens of document text per question
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_STOPWORDS = frozenset("""
+a an and are as at be but by for from has have he her his i in is it its me my of on or our she so
+that the their them they this to was we were what when where which who why will with you your
+""".split())
+
+
+def estimate_tokens(text):
+    # Rough rule of thumb for Gemini-style tokenizers: ~4 characters per token.
+    return max(1, len(text) // 4) if text else 0
+
+
+def tokenize(text):
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in _STOPWORDS]
+
+
+def _boundary(text, start, end):
+    """Pull `end` back to a paragraph, line or word break in the second half of text[start:end], if there is one."""
+    if end >= len(text): return len(text)
+    floor = start + (end - start) // 2
+    for sep in ("\n\n", "\n", " "):
+        cut = text.rfind(sep, floor, end)
+        if cut != -1: return cut + len(sep)
+    return end
+
+
+def chunk_text(text, chunk_chars=DEFAULT_CHUNK_CHARS, overlap=DEFAULT_CHUNK_OVERLAP):
+    """Split text into ~chunk_chars slices of the original string (whitespace and newlines intact),
+    cut at paragraph/line/word breaks, with neighbouring slices overlapping by up to `overlap` characters."""
+    chunks, start = [], 0
+    while start < len(text):
+        end = _boundary(text, start, start + chunk_chars)
+        chunks.append(text[start:end])
+        if end >= len(text): break
+        next_start = end - overlap
+        if next_start > start: # Begin the overlap on a word break rather than mid-word
+            space = text.find(" ", next_start, end)
+            next_start = space + 1 if space != -1 else next_start
+        start = max(next_start, start + max(1, (end - start) // 2)) # Always make progress, even with a huge overlap
+    return chunks
+
+
+class BM25Index:
+    """Small in-memory Okapi BM25 index over a list of chunks."""
+
+    def __init__(self, chunks, k1=1.5, b=0.75):
+        self.k1, self.b = k1, b
+        self.postings = {}  # term -> list of (chunk_id, term frequency)
+        self.doc_lens = []
+        for chunk_id, chunk in enumerate(chunks):
+            counts = Counter(tokenize(chunk))
+            self.doc_lens.append(sum(counts.values()))
+            for term, tf in counts.items(): self.postings.setdefault(term, []).append((chunk_id, tf))
+        self.n_docs = len(self.doc_lens)
+        self.avg_len = (sum(self.doc_lens) / self.n_docs) if self.n_docs else 0.0
+        self.idf = {term: math.log(1 + (self.n_docs - len(p) + 0.5) / (len(p) + 0.5)) for term, p in self.postings.items()}
+
+    def search(self, query, k):
+        scores = {}
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None: continue
+            for chunk_id, tf in self.postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lens[chunk_id] / (self.avg_len or 1))
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+
+class DocumentEngine:
+    """Holds one uploaded document as chunks + a BM25 index, built once at upload time."""
+
+    def __init__(self, name, text, chunk_chars=DEFAULT_CHUNK_CHARS, overlap=DEFAULT_CHUNK_OVERLAP,
+                 top_k=DEFAULT_TOP_K, token_budget=DEFAULT_TOKEN_BUDGET):
+        self.name = name
+        self.text = text
+        self.doc_id = hashlib.sha256(text.encode("utf-8", errors="replace")).hexdigest()
+        self.top_k, self.token_budget = top_k, token_budget
+        self.total_tokens = estimate_tokens(text)
+        self.chunks = chunk_text(text, chunk_chars, overlap)
+        self.index = BM25Index(self.chunks)
+
+    @property
+    def fits_whole(self):
+        return self.total_tokens <= self.token_budget
+
+    def retrieve(self, query):
+        """Return [(chunk_id, chunk_text)] in document order, within top_k and the token budget."""
+        hits = [chunk_id for chunk_id, _ in self.index.search(query, self.top_k)]
+        if not hits:
+            # Nothing matched lexically (e.g. "summarize this"): spread picks evenly across the file
+            step = max(1, len(self.chunks) // self.top_k)
+            hits = list(range(0, len(self.chunks), step))[:self.top_k]
+        selected, used = [], 0
+        for chunk_id in hits:  # Highest scoring first, so the budget keeps the best chunks
+            cost = estimate_tokens(self.chunks[chunk_id])
+            if selected and used + cost > self.token_budget: continue
+            selected.append(chunk_id); used += cost
+        return [(chunk_id, self.chunks[chunk_id]) for chunk_id in sorted(selected)]
+
+    def context(self, query):
+        """Return (text to send, chunk ids used). A file that fits the budget is sent exactly as uploaded (ids = None)."""
+        if self.fits_whole: return self.text, None
+        retrieved = self.retrieve(query)
+        excerpts = "\n\n".join(f"[Excerpt {chunk_id + 1}/{len(self.chunks)}]\n{chunk}" for chunk_id, chunk in retrieved)
+        return excerpts, [chunk_id for chunk_id, _ in retrieved]
+
+    def reference(self, chunk_ids):
+        """Short stand-in for the excerpts, stored in chat history instead of the text itself."""
+        if chunk_ids is None: return f"[Document '{self.name}' (id {self.doc_id[:12]}) was provided here in full]"
+        ids = ", ".join(str(i + 1) for i in chunk_ids)
+        return f"[Document '{self.name}' (id {self.doc_id[:12]}), excerpts {ids} of {len(self.chunks)} were provided here]"
+
+
+def compact_last_user_turn(chat_session, text):
+    """Replace the parts of the most recent user turn in a chat session's history with `text`."""
+    history = list(chat_session.history)
+    for i in range(len(history) - 1, -1, -1):
+        role = history[i]["role"] if isinstance(history[i], dict) else history[i].role
+        if role == "user":
+            history[i] = {"role": "user", "parts": [text]}
+            chat_session.history = history
+            return
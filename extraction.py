@@ -0,0 +1,202 @@
+# extraction.py
+# Text extraction for uploaded documents, with a content-hash cache so each file is parsed once.
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import closing
+
+import PyPDF2
+from docx import Document # For .docx files
+
+
+# --- Parallel PDF page extraction ---
+PDF_WORKERS = int(os.environ.get("BOLT_PDF_WORKERS", min(4, os.cpu_count() or 1)))
+PDF_PARALLEL_MIN_PAGES = 16 # Below this, a process pool costs more than it saves
+PDF_PAGES_PER_TASK = 8
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # "spawn" so workers don't inherit the Streamlit server's threads
+            _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+def _discard_pool(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool: _pool = None # The next upload gets a fresh pool
+    pool.shutdown(wait=False, cancel_futures=True)
+
+_worker_reader = (None, None) # (path, PdfReader), so a worker parses each file once across its tasks
+
+def _extract_page_range(pdf_path, start, stop):
+    global _worker_reader
+    if _worker_reader[0] != pdf_path: _worker_reader = (pdf_path, PyPDF2.PdfReader(pdf_path))
+    reader = _worker_reader[1]
+    return start, [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+def iter_pdf_pages(file_bytes, max_pages=None):
+    """Yield (page_index, page_limit, page_count, text) in page order, as soon as each page is ready.
+
+    Large PDFs are split into page ranges across a process pool; pages are released in order
+    as the contiguous prefix completes, so the first pages are available before the last ones finish.
+    """
+    reader = PyPDF2.PdfReader(io.BytesIO(file_bytes))
+    page_count = len(reader.pages)
+    page_limit = min(page_count, max_pages) if max_pages else page_count
+    if page_limit < PDF_PARALLEL_MIN_PAGES or PDF_WORKERS <= 1:
+        for i in range(page_limit): yield i, page_limit, page_count, reader.pages[i].extract_text() or ""
+        return
+
+    fd, pdf_path = tempfile.mkstemp(suffix=".pdf") # Workers read from disk instead of pickling the bytes per task
+    with os.fdopen(fd, "wb") as f: f.write(file_bytes)
+    pool, futures, next_page = _get_pool(), [], 0
+    try:
+        for start in range(0, page_limit, PDF_PAGES_PER_TASK):
+            futures.append(pool.submit(_extract_page_range, pdf_path, start, min(start + PDF_PAGES_PER_TASK, page_limit)))
+        finished = {}
+        for future in as_completed(futures):
+            start, texts = future.result()
+            finished[start] = texts
+            while next_page in finished:
+                for text in finished.pop(next_page):
+                    yield next_page, page_limit, page_count, text
+                    next_page += 1
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM-killed on a huge file): replace the pool for later uploads, finish this one here
+        _discard_pool(pool)
+        for i in range(next_page, page_limit): yield i, page_limit, page_count, reader.pages[i].extract_text() or ""
+    finally:
+        for future in futures: future.cancel() # Stops queued ranges if the caller hit a cap or an error
+        try: os.remove(pdf_path)
+        except OSError: pass
+
+
+# --- Per-format extractors ---
+# Each returns (text, truncated) and stops early once max_pages / max_chars is reached.
+def extract_pdf(file_bytes, max_pages=None, max_chars=None, on_progress=None):
+    parts, chars, truncated = [], 0, False
+    page_limit = page_count = 0
+    with closing(iter_pdf_pages(file_bytes, max_pages)) as pages:
+        for page_index, page_limit, page_count, text in pages:
+            if max_chars and chars + len(text) > max_chars:
+                parts.append(text[:max_chars - chars]); truncated = True
+                break
+            parts.append(text); chars += len(text)
+            if on_progress: on_progress(page_index + 1, page_limit, text)
+    return "".join(parts), truncated or page_limit < page_count
+
+def extract_docx(file_bytes, max_pages=None, max_chars=None, on_progress=None):
+    # python-docx parses the whole document XML in one go, so there is nothing to fan out to the pool;
+    # progress is reported per paragraph instead (about every 1%, to keep UI updates cheap).
+    paragraphs = Document(io.BytesIO(file_bytes)).paragraphs
+    total = len(paragraphs)
+    step = max(1, total // 100)
+    parts, chars = [], 0
+    for i, para in enumerate(paragraphs):
+        parts.append(para.text); chars += len(para.text) + 1
+        if max_chars and chars > max_chars: return "\n".join(parts)[:max_chars], True
+        if on_progress and (i == 0 or (i + 1) % step == 0 or i + 1 == total): on_progress(i + 1, total, para.text)
+    return "\n".join(parts), False
+
+def extract_plain_text(file_bytes, max_pages=None, max_chars=None, on_progress=None):
+    text = file_bytes.decode("utf-8", errors="replace")
+    if max_chars and len(text) > max_chars: return text[:max_chars], True
+    return text, False
+
+EXTRACTORS = {".pdf": extract_pdf, ".docx": extract_docx}
+
+
+def content_hash(file_bytes):
+    return hashlib.sha256(file_bytes).hexdigest()
+
+
+class ExtractionCache:
+    """Extracted text keyed by file content hash: a bounded in-memory LRU plus an optional on-disk tier,
+    itself capped at disk_max_entries files (least recently used by mtime are deleted first).
+
+    Also keeps per-format timings, so the sidebar can show what the cache is saving.
+    """
+
+    def __init__(self, max_entries=32, disk_dir=None, disk_max_entries=256):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.disk_max_entries = disk_max_entries
+        if disk_dir: os.makedirs(disk_dir, exist_ok=True)
+        self._entries = OrderedDict() # key -> (text, extract_seconds, truncated)
+        self._lock = threading.Lock() # Shared by every session in the Streamlit process
+        self._stats = {}
+
+    def _stat(self, file_format):
+        return self._stats.setdefault(file_format, {"extractions": 0, "extract_seconds": 0.0, "memory_hits": 0, "disk_hits": 0, "seconds_saved": 0.0})
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _prune_disk(self):
+        try:
+            with os.scandir(self.disk_dir) as it: files = [(e.stat().st_mtime, e.path) for e in it if e.name.endswith(".json")]
+        except OSError: return
+        files.sort()
+        for _, path in files[:max(0, len(files) - self.disk_max_entries)]:
+            try: os.remove(path)
+            except OSError: pass # Another process got there first
+
+    def _remember(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries: self._entries.popitem(last=False)
+
+    def extract(self, file_bytes, file_extension, max_pages=None, max_chars=None, on_progress=None):
+        """Return (text, info) where info = {"source": "memory"|"disk"|"extracted", "seconds": float, "hash": str, "truncated": bool}.
+
+        on_progress(done, total, latest_text) is called as pages are extracted (cache misses only).
+        """
+        file_hash = content_hash(file_bytes)
+        key = f"{file_hash}{file_extension}-{max_pages}-{max_chars}" # Caps change the result, so they are part of the key
+        with self._lock:
+            stat = self._stat(file_extension)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                text, seconds, truncated = self._entries[key]
+                stat["memory_hits"] += 1; stat["seconds_saved"] += seconds
+                return text, {"source": "memory", "seconds": seconds, "hash": file_hash, "truncated": truncated}
+        if self.disk_dir and os.path.exists(self._disk_path(key)):
+            try:
+                with open(self._disk_path(key), encoding="utf-8") as f: cached = json.load(f)
+                os.utime(self._disk_path(key)) # Mark as recently used for _prune_disk
+                with self._lock:
+                    self._remember(key, (cached["text"], cached["seconds"], cached["truncated"]))
+                    stat["disk_hits"] += 1; stat["seconds_saved"] += cached["seconds"]
+                return cached["text"], {"source": "disk", "seconds": cached["seconds"], "hash": file_hash, "truncated": cached["truncated"]}
+            except (OSError, ValueError, KeyError): pass # Unreadable cache file: just extract again
+
+        started = time.perf_counter()
+        text, truncated = EXTRACTORS.get(file_extension, extract_plain_text)(file_bytes, max_pages, max_chars, on_progress)
+        seconds = time.perf_counter() - started
+        with self._lock:
+            stat["extractions"] += 1; stat["extract_seconds"] += seconds
+            self._remember(key, (text, seconds, truncated))
+        if self.disk_dir:
+            try:
+                tmp_path = self._disk_path(key) + ".tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f: json.dump({"text": text, "seconds": seconds, "truncated": truncated, "format": file_extension}, f)
+                os.replace(tmp_path, self._disk_path(key))
+                self._prune_disk()
+            except OSError: pass # Disk tier is best effort
+        return text, {"source": "extracted", "seconds": seconds, "hash": file_hash, "truncated": truncated}
+
+    def stats(self):
+        with self._lock: return {fmt: dict(stat) for fmt, stat in self._stats.items()}
@@ -0,0 +1,64 @@
+# image_pipeline.py
+# Decodes each uploaded image once, downscales + re-encodes it compactly, and keeps it under its content hash.
+import hashlib
+import io
+import threading
+from collections import OrderedDict, namedtuple
+
+from PIL import Image, ImageOps
+
+DEFAULT_MAX_SIDE = 1536     # Longest side sent to the model; plenty for Gemini's vision tiles
+DEFAULT_THUMBNAIL_SIDE = 512
+DEFAULT_JPEG_QUALITY = 85
+ORIENTATION_TAG = 0x0112
+
+# data/mime_type/sha256 describe what is sent to the model; thumbnail is what the sidebar shows
+ProcessedImage = namedtuple("ProcessedImage", "data mime_type sha256 thumbnail width height original_size")
+
+
+def _encode(image, quality):
+    buffer = io.BytesIO()
+    has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+    if has_alpha:
+        image.convert("RGBA").save(buffer, format="PNG", optimize=True)
+        return buffer.getvalue(), "image/png"
+    image.convert("RGB").save(buffer, format="JPEG", quality=quality, optimize=True)
+    return buffer.getvalue(), "image/jpeg"
+
+
+def process_image(image_bytes, mime_type=None, max_side=DEFAULT_MAX_SIDE, thumbnail_side=DEFAULT_THUMBNAIL_SIDE, quality=DEFAULT_JPEG_QUALITY):
+    image = Image.open(io.BytesIO(image_bytes))
+    image.seek(0) # Animated GIF/WebP: the first frame is what we describe
+    rotated = image.getexif().get(ORIENTATION_TAG, 1) != 1
+    image = ImageOps.exif_transpose(image) # Phone photos: apply the EXIF rotation before it gets stripped
+    resized = max(image.size) > max_side
+    if resized: image.thumbnail((max_side, max_side), Image.LANCZOS)
+    data, out_mime = _encode(image, quality)
+    if not resized and not rotated and len(data) >= len(image_bytes) and mime_type in ("image/png", "image/jpeg"):
+        data, out_mime = image_bytes, mime_type # Already small and in a format the model takes as-is
+    thumbnail = image.copy()
+    thumbnail.thumbnail((thumbnail_side, thumbnail_side))
+    thumbnail_data, _ = _encode(thumbnail, quality)
+    return ProcessedImage(data, out_mime, hashlib.sha256(data).hexdigest(), thumbnail_data, image.width, image.height, len(image_bytes))
+
+
+class ImageStore:
+    """Processed images keyed by the hash of the uploaded bytes, so re-uploads skip the decode/resize work."""
+
+    def __init__(self, max_entries=16, **process_options):
+        self.max_entries = max_entries
+        self.process_options = process_options
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, image_bytes, mime_type=None):
+        key = hashlib.sha256(image_bytes).hexdigest()
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        processed = process_image(image_bytes, mime_type, **self.process_options)
+        with self._lock:
+            self._entries[key] = processed
+            while len(self._entries) > self.max_entries: self._entries.popitem(last=False)
+        return processed
@@ -0,0 +1,117 @@
+# llm_backend.py
+# The chat logic talks to a backend instead of google.generativeai directly, so it can run against a local fake.
+import time
+from abc import ABC, abstractmethod
+
+
+class ChatBackend(ABC):
+    """What app.py needs from a model provider.
+
+    start_chat(history) returns a session with a settable `history` list and
+    send_message(parts, stream=True) -> iterable of chunks with `.parts` and `.text`.
+    """
+    name = "base"
+    model_name = None # Identifies the model in cache keys
+    persona_mode = "none" # How the persona actually reaches the model, for telemetry
+
+    @abstractmethod
+    def start_chat(self, history): ...
+
+    @abstractmethod
+    def owns(self, chat_session):
+        """False if the session was started on a model this backend has since replaced."""
+
+    @abstractmethod
+    def generate_text(self, prompt): ...
+
+
+class GeminiBackend(ChatBackend):
+    name = "gemini"
+
+    def __init__(self, model, persona_mode="system"):
+        self.model = model
+        self.model_name = model.model_name
+        self.persona_mode = persona_mode
+
+    def start_chat(self, history):
+        return self.model.start_chat(history=history)
+
+    def owns(self, chat_session):
+        return chat_session.model is self.model
+
+    def generate_text(self, prompt):
+        return self.model.generate_content(prompt).text
+
+
+# --- Local fake: deterministic, no network ---
+def payload_bytes(parts):
+    size = 0
+    for part in parts:
+        if isinstance(part, str): size += len(part.encode("utf-8"))
+        elif isinstance(part, dict) and "data" in part: size += len(part["data"])
+        elif isinstance(part, dict): size += len(part.get("text", "").encode("utf-8"))
+    return size
+
+class FakeUsage:
+    def __init__(self, prompt_token_count, candidates_token_count):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+        self.total_token_count = prompt_token_count + candidates_token_count
+
+class FakeChunk:
+    def __init__(self, text, usage_metadata=None):
+        self.text = text
+        self.parts = [text]
+        self.usage_metadata = usage_metadata
+
+class FakeResponse:
+    """Streams the canned reply in fixed-size chunks, sleeping `chunk_delay` seconds before each."""
+
+    def __init__(self, session, text, request_bytes, chunk_chars, chunk_delay):
+        self.session, self.text, self.request_bytes = session, text, request_bytes
+        self.chunk_chars, self.chunk_delay = chunk_chars, chunk_delay
+        self.usage_metadata = None
+
+    def __iter__(self):
+        for start in range(0, len(self.text), self.chunk_chars):
+            if self.chunk_delay: time.sleep(self.chunk_delay)
+            yield FakeChunk(self.text[start:start + self.chunk_chars])
+        # Like Gemini, usage metadata arrives with the end of the stream; ~4 bytes per token
+        self.usage_metadata = FakeUsage(max(1, self.request_bytes // 4), max(1, len(self.text) // 4))
+        self.session.history = self.session.history + [{"role": "model", "parts": [self.text]}]
+
+class FakeChatSession:
+    def __init__(self, backend, history):
+        self.backend = backend
+        self.history = [dict(entry) for entry in history]
+        self.requests = [] # Bytes of each request (new parts + replayed history), for the benchmarks
+
+    def send_message(self, parts, stream=True):
+        if isinstance(parts, (str, dict)): parts = [parts]
+        request_bytes = payload_bytes(parts) + sum(payload_bytes(entry["parts"]) for entry in self.history)
+        self.requests.append(request_bytes)
+        self.history = self.history + [{"role": "user", "parts": list(parts)}]
+        return FakeResponse(self, self.backend.reply_for(parts), request_bytes, self.backend.chunk_chars, self.backend.chunk_delay)
+
+class FakeBackend(ChatBackend):
+    """Deterministic stand-in for Gemini: replies with `response_chars` of filler (plus one image
+    search directive, so the parser has work to do), streamed `chunk_chars` at a time."""
+    name = "fake"
+    model_name = "fake"
+
+    def __init__(self, chunk_chars=40, chunk_delay=0.0, response_chars=1200):
+        self.chunk_chars, self.chunk_delay, self.response_chars = chunk_chars, chunk_delay, response_chars
+
+    def reply_for(self, parts):
+        question = next((p for p in reversed(parts) if isinstance(p, str)), "")
+        filler = ("Bolt here with a totally deterministic answer! " * (self.response_chars // 48 + 1))[:self.response_chars]
+        return f"You asked {len(question)} characters' worth of question.\n{filler}\nIMAGE_SEARCH_TERM_1: Kyoto Kinkaku-ji Golden Pavilion\n"
+
+    def start_chat(self, history):
+        return FakeChatSession(self, history)
+
+    def owns(self, chat_session):
+        return chat_session.backend is self
+
+    def generate_text(self, prompt):
+        return f"Summary of {len(prompt)} characters of conversation."
@@ -0,0 +1,88 @@
+# response_cache.py
+# Remembers Bolt's answers per (normalized prompt, context hash, model), so repeated questions replay instantly.
+import difflib
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+_SPACE_RE = re.compile(r"\s+")
+_NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)*")
+
+
+def normalize_prompt(prompt):
+    return _SPACE_RE.sub(" ", prompt.lower()).strip().rstrip("?!. ")
+
+
+class ResponseCache:
+    """Bounded LRU of responses with a TTL, optionally backed by SQLite so answers survive restarts.
+
+    With near_duplicate=True, a miss on the exact key falls back to the most similar cached prompt
+    for the same context and model (difflib ratio >= similarity) that mentions the same numbers,
+    so "3-day itinerary" never replays the answer for "5-day itinerary".
+    """
+
+    def __init__(self, max_entries=256, ttl_seconds=3600, db_path=None, near_duplicate=False, similarity=0.9):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.near_duplicate = near_duplicate
+        self.similarity = similarity
+        self._entries = OrderedDict() # (context_hash, model_name, normalized prompt) -> (response, created)
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS responses (context_hash TEXT, model_name TEXT, prompt TEXT, response TEXT, created REAL, PRIMARY KEY (context_hash, model_name, prompt))")
+            self._db.commit()
+
+    def _fresh(self, created):
+        return time.time() - created < self.ttl_seconds
+
+    def _remember(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries: self._entries.popitem(last=False)
+
+    def _closest(self, context_hash, model_name, prompt):
+        candidates = [(key[2], entry) for key, entry in self._entries.items() if key[:2] == (context_hash, model_name) and self._fresh(entry[1])]
+        if self._db:
+            rows = self._db.execute("SELECT prompt, response, created FROM responses WHERE context_hash = ? AND model_name = ? AND created > ? ORDER BY created DESC LIMIT ?",
+                                    (context_hash, model_name, time.time() - self.ttl_seconds, self.max_entries)).fetchall()
+            candidates += [(row[0], (row[1], row[2])) for row in rows]
+        best, best_ratio = None, self.similarity
+        numbers = _NUMBER_RE.findall(prompt)
+        for candidate_prompt, entry in candidates:
+            if _NUMBER_RE.findall(candidate_prompt) != numbers: continue
+            matcher = difflib.SequenceMatcher(None, prompt, candidate_prompt)
+            if matcher.quick_ratio() < best_ratio: continue # Cheap upper bound first
+            ratio = matcher.ratio()
+            if ratio >= best_ratio: best, best_ratio = ((context_hash, model_name, candidate_prompt), entry), ratio
+        return best
+
+    def get(self, prompt, context_hash, model_name):
+        key = (context_hash or "", model_name, normalize_prompt(prompt))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None and self._db:
+                row = self._db.execute("SELECT response, created FROM responses WHERE context_hash = ? AND model_name = ? AND prompt = ?", key).fetchone()
+                if row: entry = (row[0], row[1])
+            if entry is None and self.near_duplicate:
+                match = self._closest(*key)
+                if match: key, entry = match
+            if entry is None: return None
+            if not self._fresh(entry[1]):
+                self._entries.pop(key, None)
+                return None
+            self._remember(key, entry)
+            return entry[0]
+
+    def put(self, prompt, context_hash, model_name, response):
+        key = (context_hash or "", model_name, normalize_prompt(prompt))
+        entry = (response, time.time())
+        with self._lock:
+            self._remember(key, entry)
+            if self._db:
+                self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)", key + entry)
+                self._db.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl_seconds,))
+                self._db.commit()
@@ -0,0 +1,112 @@
+# response_stream.py
+# Renders a streamed assistant response incrementally, pulling out Bolt's image directive lines as they arrive.
+import time
+
+DIRECT_IMAGE_URL_PREFIX = "DIRECT_IMAGE_URL:"
+SEARCH_TERM_PREFIXES = ("IMAGE_SEARCH_TERM_1:", "IMAGE_SEARCH_TERM_2:")
+DIRECTIVE_PREFIXES = (DIRECT_IMAGE_URL_PREFIX,) + SEARCH_TERM_PREFIXES
+CURSOR = "▌"
+
+
+def parse_directive(line):
+    """Return ("url", url) or ("term", term) for a valid directive line, else None (the line stays visible)."""
+    stripped_line = line.strip()
+    if stripped_line.startswith(DIRECT_IMAGE_URL_PREFIX):
+        url = stripped_line[len(DIRECT_IMAGE_URL_PREFIX):].strip()
+        if url.startswith("http://") or url.startswith("https://"): return "url", url
+    for term_prefix in SEARCH_TERM_PREFIXES:
+        if stripped_line.startswith(term_prefix):
+            term = stripped_line[len(term_prefix):].strip()
+            if term: return "term", term
+    return None
+
+def _may_become_directive(partial_line):
+    stripped = partial_line.lstrip()
+    return any(prefix.startswith(stripped) or stripped.startswith(prefix) for prefix in DIRECTIVE_PREFIXES)
+
+
+class DirectiveParser:
+    """Line-at-a-time parser fed with raw chunks; keeps visible lines and collects image directives."""
+
+    def __init__(self):
+        self.visible_lines = []
+        self.image_urls = []
+        self.search_terms = []
+        self._partial = "" # Current line, not yet terminated by a newline
+
+    def _take_line(self, line):
+        directive = parse_directive(line)
+        if directive is None: self.visible_lines.append(line)
+        elif directive[0] == "url": self.image_urls.append(directive[1])
+        else: self.search_terms.append(directive[1])
+
+    def feed(self, text):
+        lines = (self._partial + text).split("\n")
+        self._partial = lines.pop()
+        for line in lines: self._take_line(line)
+
+    def close(self):
+        if self._partial: self._take_line(self._partial)
+        self._partial = ""
+
+    def visible_text(self):
+        # A half-received line that could still turn out to be a directive is held back until it completes
+        if self._partial and not _may_become_directive(self._partial): return "\n".join(self.visible_lines + [self._partial])
+        return "\n".join(self.visible_lines)
+
+
+class StreamingResponse:
+    """Feeds chunks through a DirectiveParser and redraws a placeholder at most every `min_interval`
+    seconds, or sooner once `min_chars` new characters have piled up."""
+
+    def __init__(self, placeholder, min_interval=0.1, min_chars=2000):
+        self.placeholder = placeholder
+        self.min_interval, self.min_chars = min_interval, min_chars
+        self.parser = DirectiveParser()
+        self.chunks = []
+        self.redraws = 0
+        self.parse_seconds = self.render_seconds = 0.0 # Time spent in the parser vs. redrawing, for telemetry
+        self.first_chunk_at = None
+        self._last_draw = 0.0
+        self._pending_chars = 0
+
+    def _draw(self, text):
+        started = time.perf_counter()
+        self.placeholder.markdown(text)
+        self.redraws += 1
+        self._last_draw = time.perf_counter()
+        self.render_seconds += self._last_draw - started
+        self._pending_chars = 0
+
+    def feed(self, text):
+        if not text: return
+        started = time.perf_counter()
+        if self.first_chunk_at is None: self.first_chunk_at = started
+        self.chunks.append(text)
+        self.parser.feed(text)
+        self._pending_chars += len(text)
+        redraw = self._pending_chars >= self.min_chars or started - self._last_draw >= self.min_interval
+        visible_text = self.parser.visible_text() + CURSOR if redraw else None
+        self.parse_seconds += time.perf_counter() - started
+        if redraw: self._draw(visible_text)
+
+    def finish(self):
+        """Final redraw without the cursor; returns the visible text."""
+        started = time.perf_counter()
+        self.parser.close()
+        final_text = self.parser.visible_text().strip()
+        self.parse_seconds += time.perf_counter() - started
+        self._draw(final_text)
+        return final_text
+
+    @property
+    def full_text(self):
+        return "".join(self.chunks)
+
+    @property
+    def image_urls(self):
+        return self.parser.image_urls
+
+    @property
+    def search_terms(self):
+        return self.parser.search_terms
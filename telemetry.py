@@ -0,0 +1,80 @@
+# telemetry.py
+# Per-turn and per-upload metrics: kept in memory for a debug panel, appended to a JSONL file,
+# and/or served in Prometheus text format from a small local HTTP endpoint.
+import json
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_NAME_RE = re.compile(r"[^a-zA-Z0-9_]")
+
+
+def _metric_name(event, field):
+    return _NAME_RE.sub("_", f"bolt_{event}_{field}")
+
+def _label_value(value):
+    # Exposition format: backslash, double quote and newline must be escaped inside label values
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _label_text(labels):
+    return "{" + ",".join(f'{key}="{_label_value(value)}"' for key, value in sorted(labels)) + "}" if labels else ""
+
+
+class Telemetry:
+    """Collects events like record("turn", {"cache_hit": "0"}, {"total_seconds": 1.2, ...}).
+
+    Every numeric value becomes a Prometheus summary (bolt_<event>_<field>_sum / _count) per label set.
+    """
+
+    def __init__(self, jsonl_path=None, keep_recent=50):
+        self.jsonl_path = jsonl_path
+        self.recent = deque(maxlen=keep_recent)
+        self._summaries = {} # (metric name, labels) -> [sum, count]
+        self._lock = threading.Lock()
+
+    def record(self, event, labels=None, values=None):
+        labels, values = labels or {}, values or {}
+        entry = {"ts": time.time(), "event": event, **labels, **values}
+        label_key = tuple(sorted((key, str(value)) for key, value in labels.items()))
+        with self._lock:
+            self.recent.append(entry)
+            for field, value in values.items():
+                if value is None: continue
+                summary = self._summaries.setdefault((_metric_name(event, field), label_key), [0.0, 0])
+                summary[0] += value; summary[1] += 1
+            if self.jsonl_path:
+                with open(self.jsonl_path, "a", encoding="utf-8") as f: f.write(json.dumps(entry) + "\n")
+        return entry
+
+    def prometheus_text(self):
+        with self._lock: summaries = sorted(self._summaries.items())
+        lines, typed = [], set()
+        for (name, labels), (total, count) in summaries:
+            if name not in typed:
+                lines.append(f"# TYPE {name} summary"); typed.add(name)
+            lines.append(f"{name}_sum{_label_text(labels)} {total}")
+            lines.append(f"{name}_count{_label_text(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host="127.0.0.1"):
+        """Expose /metrics on a daemon thread; returns the server."""
+        telemetry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") != "/metrics":
+                    self.send_error(404); return
+                body = telemetry.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args): pass # Keep scrapes out of the Streamlit log
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, name="bolt-metrics", daemon=True).start()
+        return server
@@ -0,0 +1,75 @@
+# tests/test_chat_memory.py
+import hashlib
+
+from chat_memory import SUMMARY_PREFIX, ChatMemory
+from llm_backend import FakeBackend
+
+PERSONA = [{"role": "user", "parts": ["You are Bolt."]}, {"role": "model", "parts": ["Hi, I'm Bolt!"]}]
+IMAGE = {"mime_type": "image/png", "data": b"\x89PNG fake image bytes"}
+
+
+def make_memory(**options):
+    chat = FakeBackend().start_chat(PERSONA)
+    return chat, ChatMemory(chat, pinned=len(PERSONA), **options)
+
+def add_turn(chat, memory, user_parts, reply="ok"):
+    memory.before_turn()
+    chat.history = chat.history + [{"role": "user", "parts": user_parts}, {"role": "model", "parts": [reply]}]
+    memory.after_turn()
+
+def wait_for_summary(memory):
+    memory._pending[0].result(timeout=5)
+
+
+def test_old_attachments_are_stripped_but_recent_ones_kept():
+    chat, memory = make_memory(keep_turns=2, token_budget=100_000)
+    add_turn(chat, memory, [IMAGE, "what is in this picture?"])
+    assert hashlib.sha256(IMAGE["data"]).hexdigest() in memory.attached_hashes()
+    add_turn(chat, memory, ["and the colours?"])
+    add_turn(chat, memory, ["thanks!"]) # The image turn is now outside the verbatim window
+    assert memory.attached_hashes() == set()
+    image_turn = chat.history[len(PERSONA)]
+    assert "[Attachment (image/png, sha256 " in image_turn["parts"][0]
+    assert image_turn["parts"][1] == "what is in this picture?"
+    assert chat.history[:len(PERSONA)] == PERSONA # Pinned entries are never touched
+
+
+def test_summary_is_folded_in_before_the_next_turn():
+    summaries = []
+    def summarizer(previous_summary, turns_text):
+        summaries.append(turns_text)
+        return "They asked about Kyoto and laptops."
+    chat, memory = make_memory(keep_turns=2, token_budget=100_000, summarizer=summarizer)
+    for question in ["Kyoto temples?", "Travel laptops?", "K-dramas?"]:
+        add_turn(chat, memory, [question])
+    wait_for_summary(memory)
+    assert "USER: Kyoto temples?" in summaries[0]
+    assert memory.stats()["summary_pending"]
+
+    memory.before_turn()
+    history = chat.history
+    assert history[:len(PERSONA)] == PERSONA
+    assert history[len(PERSONA)]["parts"][0] == f"{SUMMARY_PREFIX}\nThey asked about Kyoto and laptops."
+    assert [entry["parts"][0] for entry in history[len(PERSONA) + 2::2]] == ["Travel laptops?", "K-dramas?"]
+    stats = memory.stats()
+    assert stats["summarized"] and not stats["summary_pending"] and stats["turns"] == 2
+
+
+def test_token_budget_summarizes_all_but_the_latest_turn():
+    chat, memory = make_memory(keep_turns=10, token_budget=50, summarizer=lambda previous, text: "short")
+    add_turn(chat, memory, ["a" * 400])
+    add_turn(chat, memory, ["b" * 400])
+    wait_for_summary(memory)
+    memory.before_turn()
+    assert memory.stats()["turns"] == 1
+    assert chat.history[-2]["parts"] == ["b" * 400]
+
+
+def test_failing_summarizer_falls_back_to_the_transcript_tail():
+    def summarizer(previous_summary, turns_text): raise RuntimeError("model unavailable")
+    chat, memory = make_memory(keep_turns=1, token_budget=100_000, summarizer=summarizer)
+    add_turn(chat, memory, ["Kyoto temples?"], reply="Kinkaku-ji!")
+    add_turn(chat, memory, ["Laptops?"])
+    wait_for_summary(memory)
+    memory.before_turn()
+    assert "USER: Kyoto temples?" in memory.summary and "MODEL: Kinkaku-ji!" in memory.summary
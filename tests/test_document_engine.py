@@ -0,0 +1,46 @@
+# tests/test_document_engine.py
+from document_engine import DocumentEngine, chunk_text
+
+PYTHON_SOURCE = "def f(x):\n    if x:\n        return 1\n    return 2\n"
+
+
+def test_chunks_are_slices_of_the_original_text():
+    text = "\n\n".join(f"Paragraph {i}:\n    indented line about kyoto temples\n\tand a tab" for i in range(200))
+    chunks = chunk_text(text, chunk_chars=300, overlap=50)
+    assert len(chunks) > 1
+    assert all(chunk in text for chunk in chunks) # Whitespace and newlines survive
+    assert chunks[0].startswith("Paragraph 0:\n    indented")
+    assert chunks[-1].endswith(text[-20:])
+
+
+def test_chunks_cover_the_whole_text_with_bounded_overlap():
+    text = " ".join(f"word{i}" for i in range(5000))
+    chunks = chunk_text(text, chunk_chars=500, overlap=100)
+    positions, start = [], 0
+    for chunk in chunks:
+        index = text.find(chunk, start)
+        positions.append((index, index + len(chunk)))
+        start = index + 1
+    assert positions[0][0] == 0 and positions[-1][1] == len(text)
+    for (_, prev_end), (next_start, _) in zip(positions, positions[1:]):
+        assert 0 <= prev_end - next_start <= 100 # Contiguous, overlapping by at most `overlap`
+
+
+def test_huge_overlap_still_terminates():
+    assert len(chunk_text("abc " * 1000, chunk_chars=100, overlap=10_000)) < 100
+
+
+def test_small_file_is_sent_exactly_as_uploaded():
+    engine = DocumentEngine("f.py", PYTHON_SOURCE)
+    text, chunk_ids = engine.context("what does f return?")
+    assert text == PYTHON_SOURCE and chunk_ids is None
+    assert "in full" in engine.reference(chunk_ids)
+
+
+def test_large_file_sends_relevant_excerpts_within_budget():
+    filler = "\n".join(f"Line {i} about laptops and batteries." for i in range(3000))
+    engine = DocumentEngine("big.txt", filler + "\nThe secret zebra lives in Kyoto.\n" + filler, chunk_chars=500, top_k=3, token_budget=400)
+    text, chunk_ids = engine.context("where does the zebra live?")
+    assert "The secret zebra lives in Kyoto." in text
+    assert 1 <= len(chunk_ids) <= 3
+    assert len(text) // 4 <= 400 + 50 # Budget plus the excerpt headers
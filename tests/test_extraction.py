@@ -0,0 +1,107 @@
+# tests/test_extraction.py
+import io
+import os
+
+import pytest
+from docx import Document
+
+import extraction
+from extraction import ExtractionCache, extract_docx, extract_pdf, iter_pdf_pages
+
+
+def make_pdf(page_texts):
+    """A minimal text PDF, one line of Helvetica per page."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for text in page_texts:
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        page_ids.append(len(objects))
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] /Count {len(page_ids)} >>"
+    out, offsets = io.BytesIO(), []
+    out.write(b"%PDF-1.4\n")
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1"))
+    xref_at = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1"))
+    for offset in offsets: out.write(f"{offset:010d} 00000 n \n".encode("latin-1"))
+    out.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_at}\n%%EOF\n".encode("latin-1"))
+    return out.getvalue()
+
+def make_docx(paragraphs):
+    document, buffer = Document(), io.BytesIO()
+    for paragraph in paragraphs: document.add_paragraph(paragraph)
+    document.save(buffer)
+    return buffer.getvalue()
+
+PAGES = [f"Page {i} about Kyoto" for i in range(20)]
+
+
+@pytest.fixture
+def parallel_pdf(monkeypatch):
+    monkeypatch.setattr(extraction, "PDF_WORKERS", 2)
+    monkeypatch.setattr(extraction, "PDF_PARALLEL_MIN_PAGES", 4)
+    monkeypatch.setattr(extraction, "PDF_PAGES_PER_TASK", 3)
+    yield make_pdf(PAGES)
+
+
+def test_pool_yields_pages_in_order(parallel_pdf):
+    pages = list(iter_pdf_pages(parallel_pdf))
+    assert [page[0] for page in pages] == list(range(20))
+    assert [page[3].strip() for page in pages] == PAGES
+    assert extraction._pool is not None # Really went through the pool
+
+
+def test_dead_worker_falls_back_to_serial_and_replaces_the_pool(parallel_pdf):
+    list(iter_pdf_pages(parallel_pdf)) # Make sure the pool has started its workers
+    broken_pool = extraction._pool
+    for process in list(broken_pool._processes.values()):
+        process.kill(); process.join()
+    assert [page[3].strip() for page in iter_pdf_pages(parallel_pdf)] == PAGES
+    assert extraction._pool is not broken_pool
+    assert [page[3].strip() for page in iter_pdf_pages(parallel_pdf)] == PAGES # The new pool works
+
+
+def test_pdf_caps_set_truncated():
+    pdf = make_pdf(PAGES[:5])
+    text, truncated = extract_pdf(pdf)
+    assert not truncated and "Page 4" in text
+    text, truncated = extract_pdf(pdf, max_pages=3)
+    assert truncated and "Page 2" in text and "Page 3" not in text
+    text, truncated = extract_pdf(pdf, max_chars=30)
+    assert truncated and len(text) == 30
+
+
+def test_docx_char_cap_and_progress():
+    docx = make_docx([f"Paragraph {i}" for i in range(10)])
+    progress = []
+    text, truncated = extract_docx(docx, on_progress=lambda done, total, latest: progress.append((done, total)))
+    assert not truncated and text.splitlines()[-1] == "Paragraph 9" and progress[-1] == (10, 10)
+    text, truncated = extract_docx(docx, max_chars=25)
+    assert truncated and text == "Paragraph 0\nParagraph 1\nParagraph 2"[:25]
+
+
+def test_cache_hits_memory_then_disk_and_keys_on_caps(tmp_path):
+    docx = make_docx(["Kyoto temples", "Laptop batteries"])
+    cache = ExtractionCache(disk_dir=str(tmp_path))
+    text, info = cache.extract(docx, ".docx")
+    assert info["source"] == "extracted" and text == "Kyoto temples\nLaptop batteries"
+    assert cache.extract(docx, ".docx")[1]["source"] == "memory"
+    assert ExtractionCache(disk_dir=str(tmp_path)).extract(docx, ".docx") == (text, {**info, "source": "disk"})
+    capped, capped_info = cache.extract(docx, ".docx", max_chars=5) # Same file, different caps: a separate entry
+    assert capped == "Kyoto" and capped_info["source"] == "extracted" and capped_info["truncated"]
+    stats = cache.stats()[".docx"]
+    assert stats["extractions"] == 2 and stats["memory_hits"] == 1
+
+
+def test_disk_tier_keeps_only_the_most_recently_used_files(tmp_path):
+    cache = ExtractionCache(max_entries=1, disk_dir=str(tmp_path), disk_max_entries=2)
+    for i in range(4):
+        cache.extract(f"document {i}".encode(), ".txt")
+        for entry in os.scandir(tmp_path): # Pin mtimes so eviction order doesn't depend on the clock's resolution
+            if entry.stat().st_mtime > 1000: os.utime(entry.path, (i, i))
+    assert len(os.listdir(tmp_path)) == 2
+    assert ExtractionCache(disk_dir=str(tmp_path)).extract(b"document 3", ".txt")[1]["source"] == "disk"
+    assert ExtractionCache(disk_dir=str(tmp_path)).extract(b"document 0", ".txt")[1]["source"] == "extracted"
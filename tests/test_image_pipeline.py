@@ -0,0 +1,34 @@
+# tests/test_image_pipeline.py
+import io
+
+from PIL import Image
+
+from image_pipeline import ImageStore, process_image
+
+
+def encode(image, format):
+    buffer = io.BytesIO()
+    image.save(buffer, format=format)
+    return buffer.getvalue()
+
+
+def test_large_image_is_downscaled_even_if_the_result_is_bigger():
+    # A flat PNG compresses far better than the JPEG it becomes, but must still be resized
+    original = encode(Image.new("RGB", (4000, 3000), "white"), "PNG")
+    processed = process_image(original, "image/png", max_side=1000)
+    assert processed.data != original
+    assert (processed.width, processed.height) == (1000, 750)
+    assert max(Image.open(io.BytesIO(processed.data)).size) == 1000
+    assert processed.original_size == len(original)
+
+
+def test_small_image_keeps_its_original_bytes_when_reencoding_does_not_help():
+    original = encode(Image.new("RGB", (64, 48), "white"), "PNG")
+    processed = process_image(original, "image/png", max_side=1000)
+    assert processed.data == original and processed.mime_type == "image/png"
+
+
+def test_store_processes_each_upload_once():
+    store = ImageStore(max_entries=1, max_side=1000)
+    original = encode(Image.effect_noise((200, 150), 40).convert("RGB"), "PNG")
+    assert store.get(original, "image/png") is store.get(original, "image/png")
@@ -0,0 +1,38 @@
+# tests/test_response_cache.py
+from chat_memory import history_hash
+from response_cache import ResponseCache, normalize_prompt
+
+
+def test_exact_hits_ignore_case_spacing_and_trailing_punctuation():
+    cache = ResponseCache()
+    cache.put("What are the main points?", "doc", "model", "Three of them!")
+    assert normalize_prompt("  what are the   MAIN points ") == normalize_prompt("What are the main points?")
+    assert cache.get("  what are the   MAIN points ", "doc", "model") == "Three of them!"
+    assert cache.get("What are the main points?", "other-doc", "model") is None
+    assert cache.get("What are the main points?", "doc", "other-model") is None
+
+
+def test_near_duplicates_respect_the_threshold_and_numbers():
+    cache = ResponseCache(near_duplicate=True, similarity=0.9)
+    cache.put("Plan a 3-day itinerary for Kyoto", "doc", "model", "Day 1, 2, 3")
+    assert cache.get("Plan a 3 day itinerary for Kyoto", "doc", "model") == "Day 1, 2, 3"
+    assert cache.get("Plan a 5-day itinerary for Kyoto", "doc", "model") is None # ~0.96 similar, different trip
+    assert cache.get("Plan an itinerary for Osaka", "doc", "model") is None
+    strict = ResponseCache(near_duplicate=True, similarity=0.99)
+    strict.put("Plan a 3-day itinerary for Kyoto", "doc", "model", "Day 1, 2, 3")
+    assert strict.get("Plan a 3 day itinerary for Kyoto!!", "doc", "model") is None
+
+
+def test_answers_are_scoped_to_the_conversation():
+    alice = [{"role": "user", "parts": ["My name is Alice and I live in Lyon."]}, {"role": "model", "parts": ["Bonjour Alice!"]}]
+    cache = ResponseCache()
+    cache.put("Summarize this for me", f"doc:{history_hash(alice)}", "model", "Alice, from Lyon: here's your summary")
+    assert cache.get("Summarize this for me", f"doc:{history_hash([])}", "model") is None
+    assert history_hash(alice) == history_hash([dict(entry) for entry in alice])
+
+
+def test_entries_expire_and_persist_in_sqlite(tmp_path):
+    db_path = str(tmp_path / "responses.db")
+    ResponseCache(db_path=db_path).put("Hi", "doc", "model", "Hello!")
+    assert ResponseCache(db_path=db_path).get("Hi", "doc", "model") == "Hello!"
+    assert ResponseCache(db_path=db_path, ttl_seconds=0).get("Hi", "doc", "model") is None
@@ -0,0 +1,81 @@
+# tests/test_response_stream.py
+import random
+
+from response_stream import CURSOR, DirectiveParser, StreamingResponse
+
+REPLY = """Kyoto in 3 days? Bolt is SO in! 🏯
+**Day 1:** Kinkaku-ji, then matcha.
+IMAGE_SEARCH_TERM_1: Kyoto Kinkaku-ji Golden Pavilion
+  IMAGE_SEARCH_TERM_2: Fushimi Inari torii gates at dawn
+DIRECT_IMAGE_URL: https://upload.wikimedia.org/kinkakuji.jpg
+DIRECT_IMAGE_URL: not-a-url
+IMAGE_SEARCH_TERM_1:
+Pro tip: IMAGE_SEARCH_TERM_1: only counts at the start of a line!
+Sayonara! ✨"""
+
+
+def original_parse(full_response_content):
+    """The post-processing loop app.py ran on the complete reply before streaming parsing (kept for parity)."""
+    final_text_lines, direct_image_urls, search_terms = [], [], []
+    for line in full_response_content.split("\n"):
+        stripped_line = line.strip()
+        if stripped_line.startswith("DIRECT_IMAGE_URL:"):
+            url = stripped_line.split(":", 1)[1].strip()
+            if url and (url.startswith("http://") or url.startswith("https://")): direct_image_urls.append(url); continue
+            final_text_lines.append(line)
+        elif stripped_line.startswith("IMAGE_SEARCH_TERM_1:") or stripped_line.startswith("IMAGE_SEARCH_TERM_2:"):
+            term_prefix = "IMAGE_SEARCH_TERM_1:" if stripped_line.startswith("IMAGE_SEARCH_TERM_1:") else "IMAGE_SEARCH_TERM_2:"
+            term = stripped_line.split(term_prefix, 1)[1].strip()
+            if term: search_terms.append(term); continue
+            final_text_lines.append(line)
+        else: final_text_lines.append(line)
+    return "\n".join(final_text_lines).strip(), direct_image_urls, search_terms
+
+
+class RecordingPlaceholder:
+    def __init__(self): self.drawn = []
+    def markdown(self, text): self.drawn.append(text)
+
+
+def stream(text, cut_points, **options):
+    placeholder = RecordingPlaceholder()
+    response = StreamingResponse(placeholder, **{"min_interval": 0, "min_chars": 1, **options})
+    bounds = [0] + sorted(cut_points) + [len(text)]
+    for start, stop in zip(bounds, bounds[1:]): response.feed(text[start:stop])
+    return response, response.finish(), placeholder.drawn
+
+
+def test_matches_the_original_parser_for_any_chunking():
+    expected = original_parse(REPLY)
+    rng = random.Random(6)
+    chunkings = [list(range(1, len(REPLY)))] + [rng.sample(range(1, len(REPLY)), rng.randint(0, 40)) for _ in range(300)]
+    for cut_points in chunkings:
+        response, final_text, _ = stream(REPLY, cut_points)
+        assert (final_text, response.image_urls, response.search_terms) == expected
+        assert response.full_text == REPLY
+
+
+def test_directive_split_across_chunks():
+    parser = DirectiveParser()
+    for piece in ["Look!\nIMAGE_SEA", "RCH_TERM_2: Osaka", " castle\nBye"]: parser.feed(piece)
+    parser.close()
+    assert parser.search_terms == ["Osaka castle"]
+    assert parser.visible_text() == "Look!\nBye"
+
+
+def test_partial_directive_never_flashes_on_screen():
+    reply = "Kinkaku-ji!\nIMAGE_SEARCH_TERM_1: Golden Pavilion\n  DIRECT_IMAGE_URL: https://example.com/k.jpg\nEnjoy"
+    _, _, drawn = stream(reply, range(1, len(reply))) # One character at a time, redrawing after each
+    assert all("IMAGE" not in frame and "https:" not in frame for frame in drawn)
+    assert all(frame.endswith(CURSOR) for frame in drawn[:-1]) and not drawn[-1].endswith(CURSOR)
+
+
+def test_invalid_url_and_empty_term_stay_visible():
+    response, final_text, _ = stream("DIRECT_IMAGE_URL: ftp://nope.png\nIMAGE_SEARCH_TERM_2:   \nok", [5, 20])
+    assert final_text == "DIRECT_IMAGE_URL: ftp://nope.png\nIMAGE_SEARCH_TERM_2:   \nok"
+    assert response.image_urls == [] and response.search_terms == []
+
+
+def test_redraws_are_throttled():
+    _, _, drawn = stream("x" * 1000, range(10, 1000, 10), min_interval=3600, min_chars=250)
+    assert len(drawn) == 4 + 1 # Every 250 chars, plus the final draw
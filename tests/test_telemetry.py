@@ -0,0 +1,31 @@
+# tests/test_telemetry.py
+import json
+
+from telemetry import Telemetry
+
+
+def test_values_become_prometheus_summaries_per_label_set():
+    telemetry = Telemetry()
+    telemetry.record("turn", {"backend": "fake", "cache_hit": 0}, {"total_seconds": 1.5, "input_tokens": None})
+    telemetry.record("turn", {"backend": "fake", "cache_hit": 0}, {"total_seconds": 0.5})
+    text = telemetry.prometheus_text()
+    assert "# TYPE bolt_turn_total_seconds summary" in text
+    assert 'bolt_turn_total_seconds_sum{backend="fake",cache_hit="0"} 2.0' in text
+    assert 'bolt_turn_total_seconds_count{backend="fake",cache_hit="0"} 2' in text
+    assert "input_tokens" not in text # None values are skipped
+
+
+def test_label_values_are_escaped():
+    telemetry = Telemetry()
+    telemetry.record("upload", {"file": 'C:\\docs\\"notes"\nv2.txt'}, {"seconds": 1})
+    assert 'bolt_upload_seconds_count{file="C:\\\\docs\\\\\\"notes\\"\\nv2.txt"} 1' in telemetry.prometheus_text()
+
+
+def test_events_are_appended_to_jsonl(tmp_path):
+    path = tmp_path / "metrics.jsonl"
+    telemetry = Telemetry(jsonl_path=str(path), keep_recent=1)
+    telemetry.record("turn", {"backend": "fake"}, {"total_seconds": 1})
+    telemetry.record("upload", {"kind": "image"}, {"seconds": 2})
+    events = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [event["event"] for event in events] == ["turn", "upload"]
+    assert len(telemetry.recent) == 1 and telemetry.recent[0]["kind"] == "image"
@@ -0,0 +1,32 @@
+# tests/test_transcript_store.py
+import time
+
+from transcript_store import TranscriptStore
+
+
+def test_recent_is_windowed_and_oldest_first(tmp_path):
+    store = TranscriptStore(str(tmp_path / "t.db"))
+    for i in range(5): store.append("s1", "user", f"message {i}")
+    store.append("s2", "user", "someone else")
+    assert [m["content"] for m in store.recent("s1", 2)] == ["message 3", "message 4"]
+
+
+def test_chat_history_skips_error_notices(tmp_path):
+    store = TranscriptStore(str(tmp_path / "t.db"))
+    store.append("s", "user", "Kyoto?"); store.append("s", "assistant", "Temples!")
+    store.append("s", "user", "Laptops?"); store.append("s", "assistant", "Sorry, I ran into an issue", kind="error")
+    store.append("s", "user", "K-dramas?"); store.append("s", "assistant", "So many!")
+    assert store.chat_history("s", 5) == [{"role": "user", "parts": ["Kyoto?"]}, {"role": "model", "parts": ["Temples!"]},
+                                          {"role": "user", "parts": ["K-dramas?"]}, {"role": "model", "parts": ["So many!"]}]
+    assert store.chat_history("s", 1) == [{"role": "user", "parts": ["K-dramas?"]}, {"role": "model", "parts": ["So many!"]}]
+
+
+def test_messages_past_retention_are_pruned(tmp_path):
+    db_path = str(tmp_path / "t.db")
+    store = TranscriptStore(db_path)
+    store.append("s", "user", "old")
+    store._db.execute("UPDATE messages SET created = ?", (time.time() - 10 * 86400,))
+    store._db.commit()
+    store.append("s", "user", "new")
+    assert TranscriptStore(db_path, retention_days=7).prune() == 0 # Already pruned on open
+    assert [m["content"] for m in TranscriptStore(db_path).recent("s", 10)] == ["new"]
@@ -0,0 +1,62 @@
+# transcript_store.py
+# Chat transcripts in SQLite, so sessions survive restarts and the UI only loads the messages it shows.
+import sqlite3
+import threading
+import time
+
+
+PRUNE_INTERVAL_SECONDS = 3600
+
+
+class TranscriptStore:
+    """Append-only message log per session id. Reads are windowed: recent(session_id, limit) never loads more than asked.
+
+    With retention_days set, messages older than that are deleted on startup and then at most hourly on append.
+    """
+
+    def __init__(self, db_path, retention_days=None):
+        self.retention_days = retention_days
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock() # One connection shared by every session in the process
+        self._last_prune = 0.0
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS messages (id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, role TEXT NOT NULL, content TEXT NOT NULL, kind TEXT NOT NULL DEFAULT 'message', created REAL NOT NULL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS messages_by_session ON messages (session_id, id)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS messages_by_created ON messages (created)")
+            self._db.commit()
+        self.prune()
+
+    def prune(self):
+        """Delete messages past the retention period; returns how many were removed."""
+        if not self.retention_days: return 0
+        with self._lock:
+            self._last_prune = time.time()
+            cursor = self._db.execute("DELETE FROM messages WHERE created < ?", (self._last_prune - self.retention_days * 86400,))
+            self._db.commit()
+            return cursor.rowcount
+
+    def append(self, session_id, role, content, kind="message"):
+        """kind is "message" for real turns or "error" for error notices (shown, but never replayed to the model)."""
+        if self.retention_days and time.time() - self._last_prune > PRUNE_INTERVAL_SECONDS: self.prune()
+        with self._lock:
+            cursor = self._db.execute("INSERT INTO messages (session_id, role, content, kind, created) VALUES (?, ?, ?, ?, ?)", (session_id, role, content, kind, time.time()))
+            self._db.commit()
+            return cursor.lastrowid
+
+    def recent(self, session_id, limit):
+        """The last `limit` messages of a session, oldest first."""
+        with self._lock:
+            rows = self._db.execute("SELECT id, role, content, kind FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?", (session_id, limit)).fetchall()
+        return [{"id": row[0], "role": row[1], "content": row[2], "kind": row[3]} for row in reversed(rows)]
+
+    def chat_history(self, session_id, max_turns):
+        """The last `max_turns` complete user/assistant turns as Gemini-style history entries."""
+        history, pending_user = [], None
+        for message in self.recent(session_id, max_turns * 4): # Headroom for error notices, which are skipped
+            if message["kind"] != "message": pending_user = None
+            elif message["role"] == "user": pending_user = message["content"]
+            elif pending_user is not None:
+                history += [{"role": "user", "parts": [pending_user]}, {"role": "model", "parts": [message["content"]]}]
+                pending_user = None
+        return history[-max_turns * 2:]